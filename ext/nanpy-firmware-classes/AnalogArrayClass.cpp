@@ -0,0 +1,29 @@
+#include "cfg.h"
+
+#if USE_AnalogArray
+
+#include <Arduino.h>
+#include "AnalogArrayClass.h"
+#include "MethodDescriptor.h"
+
+const char* nanpy::AnalogArrayClass::get_firmware_id()
+{
+    return "AnalogArray";
+}
+
+void nanpy::AnalogArrayClass::elaborate( nanpy::MethodDescriptor* m ) {
+    if (strcmp(m->getClass(), "AnalogArray") == 0) {
+        if (strcmp(m->getName(), "read") == 0) { // analogRead of each pin in the arguments
+            String readings;
+            for (int i = 0; i < m->getNArgs(); i++) {
+                if (i > 0) {
+                    readings += ' ';
+                }
+                readings += analogRead(m->getInt(i));
+            }
+            m->returns(readings);
+        }
+    }
+};
+
+#endif
@@ -0,0 +1,13 @@
+#pragma once
+
+#include "BaseClass.h"
+
+// Reads several analog pins in one request, and returns the readings in one response, as a
+// line of space-separated integers in the order of the pins in the request.
+namespace nanpy {
+    class AnalogArrayClass: public BaseClass {
+        public:
+            const char* get_firmware_id();
+            void elaborate( MethodDescriptor* m );
+    };
+}
@@ -12,6 +12,9 @@
 // low level mapping of pins and ports
 #define USE_ArduinoCore                             1
 
+// read several analog pins in one request; see nanpy-firmware-classes/AnalogArrayClass.h
+#define USE_AnalogArray                             1
+
 // read, write RAM
 #define USE_RAM                                     1
 
@@ -16,6 +16,12 @@ ROOT_DIR = os.path.dirname(os.path.realpath(__file__))
 EXTERNAL_DIR_NAME = 'ext'
 NANPY_CONFIG_FILE_NAME = 'nanpy-firmware-config.h'
 NANPY_FIRMWARE_DIR_NAME = 'nanpy-firmware'
+NANPY_CLASSES_DIR_NAME = 'nanpy-firmware-classes'
+NANPY_SKETCH_FILE_NAME = 'Nanpy.ino'
+# Custom firmware classes, as tuples of the class name and the cfg.h feature which enables it
+NANPY_CLASSES = [
+    ('AnalogArrayClass', 'USE_AnalogArray')
+]
 
 def configure_nanpy_firmware():
     """Copies the firmware configuration file into the nanpy-firmware submodule."""
@@ -23,12 +29,45 @@ def configure_nanpy_firmware():
     config_source_path = os.path.join(ext_dir, NANPY_CONFIG_FILE_NAME)
     config_target_path = os.path.join(ext_dir, NANPY_FIRMWARE_DIR_NAME, 'Nanpy', 'cfg.h')
     shutil.copyfile(config_source_path, config_target_path)
+    install_nanpy_classes()
     relative_nanpy_dir = os.path.join(EXTERNAL_DIR_NAME, NANPY_FIRMWARE_DIR_NAME, 'Nanpy')
     print("The nanpy-firmware submodule has been configured. Now copy the "
           "{} directory into your Arduino \"sketchbook\" directory, "
           "open the Nanpy sketchbook project in your Arduino IDE, "
           "and upload it to your Arduino.".format(relative_nanpy_dir))
 
+def install_nanpy_classes():
+    """Copies the custom firmware classes into the nanpy-firmware submodule, and registers them
+    in the Nanpy sketch if they aren't already registered.
+    """
+    ext_dir = os.path.join(ROOT_DIR, EXTERNAL_DIR_NAME)
+    classes_dir = os.path.join(ext_dir, NANPY_CLASSES_DIR_NAME)
+    sketch_dir = os.path.join(ext_dir, NANPY_FIRMWARE_DIR_NAME, 'Nanpy')
+    sketch_path = os.path.join(sketch_dir, NANPY_SKETCH_FILE_NAME)
+    with open(sketch_path) as sketch_file:
+        sketch_lines = sketch_file.read().splitlines()
+    for (class_name, feature) in NANPY_CLASSES:
+        for extension in ('.h', '.cpp'):
+            shutil.copyfile(os.path.join(classes_dir, class_name + extension),
+                            os.path.join(sketch_dir, class_name + extension))
+        include_line = '#include "{}.h"'.format(class_name)
+        register_line = '    REGISTER_CLASS_CONDITIONAL(nanpy::{}, {});'.format(class_name, feature)
+        if include_line in sketch_lines:
+            continue
+        try:
+            include_index = max(index for (index, line) in enumerate(sketch_lines)
+                                if line.startswith('#include'))
+            sketch_lines.insert(include_index + 1, include_line)
+            register_index = next(index for (index, line) in enumerate(sketch_lines)
+                                  if 'REGISTER_CLASS' in line and '#define' not in line)
+            sketch_lines.insert(register_index, register_line)
+        except (ValueError, StopIteration):
+            raise RuntimeError("Could not find where to register {} in {}. Add the lines\n{}\n"
+                               "and\n{}\nto it manually.".format(class_name, sketch_path,
+                                                                 include_line, register_line))
+    with open(sketch_path, 'w') as sketch_file:
+        sketch_file.write('\n'.join(sketch_lines) + '\n')
+
 if __name__ == '__main__':
     configure_nanpy_firmware()
 
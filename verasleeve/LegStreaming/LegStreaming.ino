@@ -0,0 +1,102 @@
+/*
+ * Streams the readings of the fluid pressure sensors of the leg model test fixture.
+ * Samples the sensors on its own timer and sends each set of readings as a binary frame, for
+ * leg.StreamingLeg on the computer. The frame format must match the one in verasleeve/leg.py:
+ *   2 bytes: frame start marker, 0xA5 0x5A
+ *   2 bytes: sequence number of the frame, which wraps around
+ *   4 bytes: micros() when the sensors were sampled
+ *   6 bytes: readings of the top low-range, top high-range, and bottom sensors
+ *   1 byte: checksum, the sum of the sequence number, time, and readings bytes
+ * All multi-byte values are little-endian and unsigned. Sampling deadlines which are missed
+ * (e.g. because the serial transmit buffer is full) are skipped, but still consume sequence
+ * numbers, so that the computer can count them.
+ *
+ * Commands from the computer are single bytes:
+ *   'S', followed by the sampling interval in microseconds as 4 bytes: starts streaming.
+ *   'X': stops streaming.
+ */
+
+const long kSerialRate = 115200; // Rate of serial data
+const int kNumPins = 3;
+const int kPressurePins[kNumPins] = {A0, A1, A2}; // Top low-range, top high-range, bottom
+const unsigned long kDefaultInterval = 2000; // Sampling interval if none is given, in us
+const byte kFrameStart[] = {0xA5, 0x5A};
+const int kFrameSize = 15;
+
+bool streaming = false;
+unsigned long interval = kDefaultInterval;
+unsigned long nextSampleTime = 0;
+unsigned int sequence = 0;
+
+void setup() {
+  // initialize serial communications
+  Serial.begin(kSerialRate);
+}
+
+void loop() {
+  readCommand();
+  if (!streaming) {
+    return;
+  }
+  unsigned long now = micros();
+  if ((long)(now - nextSampleTime) < 0) {
+    return;
+  }
+  sendFrame(now);
+  nextSampleTime += interval;
+  while ((long)(now - nextSampleTime) >= 0) { // skip missed deadlines
+    nextSampleTime += interval;
+    ++sequence;
+  }
+}
+
+void readCommand() {
+  if (Serial.available() == 0) {
+    return;
+  }
+  int command = Serial.peek();
+  if (command == 'S') {
+    if (Serial.available() < 5) { // wait for the rest of the command
+      return;
+    }
+    Serial.read();
+    interval = 0;
+    for (int i = 0; i < 4; ++i) {
+      interval |= (unsigned long) Serial.read() << (8 * i);
+    }
+    if (interval == 0) {
+      interval = kDefaultInterval;
+    }
+    sequence = 0;
+    nextSampleTime = micros();
+    streaming = true;
+  } else {
+    Serial.read();
+    if (command == 'X') {
+      streaming = false;
+    }
+  }
+}
+
+void sendFrame(unsigned long sampleTime) {
+  byte frame[kFrameSize];
+  frame[0] = kFrameStart[0];
+  frame[1] = kFrameStart[1];
+  frame[2] = sequence & 0xFF;
+  frame[3] = sequence >> 8;
+  for (int i = 0; i < 4; ++i) {
+    frame[4 + i] = (sampleTime >> (8 * i)) & 0xFF;
+  }
+  for (int i = 0; i < kNumPins; ++i) {
+    int reading = analogRead(kPressurePins[i]);
+    frame[8 + 2 * i] = reading & 0xFF;
+    frame[9 + 2 * i] = reading >> 8;
+  }
+  byte checksum = 0;
+  for (int i = 2; i < kFrameSize - 1; ++i) {
+    checksum += frame[i];
+  }
+  frame[kFrameSize - 1] = checksum;
+  Serial.write(frame, kFrameSize);
+  ++sequence;
+}
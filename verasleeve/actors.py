@@ -1,12 +1,24 @@
 """Defines some generic classes for pykka actors."""
 # Python imports
 import time
+import math
+import heapq
+import queue
 import logging
+import threading
+import itertools
 import collections
+import concurrent.futures
 
 # Dependency imports
+import numpy as np
 import pykka
 
+# Package imports
+from verasleeve import clocks, instrumentation, messages, tracing
+
+_tracer = tracing.get_tracer(__name__)
+
 class NamedActor(object):
     """Actor with a name for printing."""
     def __init__(self, name):
@@ -17,20 +29,49 @@ class NamedActor(object):
         return "{} ({})".format(self.__class__.__name__, self.__name)
 
 class Broadcaster(object):
-    """Selectively broadcasts messages to registered actors."""
-    def __init__(self):
-        super().__init__()
+    """Selectively broadcasts messages to registered actors.
+    Optionally accumulates data samples into batches, so that each registered actor receives a
+    single batch data message for many samples; batching is enabled by set_batching. Batching
+    times are measured on the instance's clock, if it has one (e.g. a Producer).
+    Keyword arguments of the constructor are passed on to the next base class, e.g. the clock of
+    a Producer.
+    """
+    def __init__(self, **kwargs):
+        super().__init__(**kwargs)
         self.__registry = collections.defaultdict(set)
         self.__logger = logging.getLogger(__name__)
+        self.__batch_max_size = None
+        self.__batch_max_latency = None
+        self.__batches = {}
+        self.__last_sample_times = {}
+        _tracer.refresh() # logging may have been configured after this module was imported
 
-    def register(self, target_actor, broadcast_class='all'):
+    def register(self, target_actor, broadcast_class='all', mailbox_limit=None,
+                 overflow_policy='drop oldest'):
         """Registers a target actor to listen for all messages of the specified broadcast class.
 
         Arguments:
             broadcast_class: the class of the message to register the target. Must be of an
             immutable data type.
             target_actor: an actor.
+            mailbox_limit: if not None, limits the number of messages waiting in the mailbox of
+            the target actor, which must have a bounded mailbox (see BoundedMailbox). The limit
+            applies to all messages sent to the target actor, not just those from this instance.
+            overflow_policy: how the target actor's mailbox handles a data message which arrives
+            while the mailbox is full (see BoundedInbox).
+
+        Exceptions:
+            ValueError: the target actor doesn't have a bounded mailbox, or the overflow policy
+            is unknown.
         """
+        if mailbox_limit is not None:
+            inbox = getattr(target_actor, 'actor_inbox', None)
+            if isinstance(inbox, BoundedInbox):
+                inbox.set_limit(mailbox_limit, overflow_policy)
+            elif isinstance(target_actor, PooledActorRef):
+                target_actor.set_mailbox_limit(mailbox_limit, overflow_policy)
+            else:
+                raise ValueError("{} doesn't have a bounded mailbox".format(target_actor))
         if broadcast_class not in self.__registry:
             self.__registry[broadcast_class] = set()
         self.__registry[broadcast_class].add(target_actor)
@@ -50,14 +91,108 @@ class Broadcaster(object):
             raise ValueError("No actor is currently registered to listen for messages of "
                              "broadcast class \"{}\"".format(broadcast_class))
 
+    def set_batching(self, max_size=None, max_latency=None):
+        """Sets how data samples are accumulated into batches before being broadcast.
+        Data messages of single samples, which have time and data entries, are then accumulated
+        separately for each broadcast class, and broadcast as a single batch data message, whose
+        time and data entries are NumPy arrays, once max_size samples have been accumulated or once
+        waiting for the next sample would delay the first sample by more than max_latency seconds.
+        The next sample is expected after the same interval as the previous sample, except in a
+        Producer, which also broadcasts its batches right after producing a sample if its next
+        sample is not due before max_latency would be exceeded; so for a Producer, max_latency holds
+        even for the first sample and when the sample rate drops, and it broadcasts its batches when
+        it stops producing. A batch of a single sample is broadcast as the original message. Any
+        other message, including messages without a time entry, is broadcast immediately, after any
+        samples accumulated before it on the same broadcast class.
+        If max_size and max_latency are both None, samples are not batched.
+
+        Arguments:
+            max_size: the maximum number of samples in a batch.
+            max_latency: the maximum time, in seconds, to hold a sample before broadcasting it.
+        """
+        self.flush()
+        self.__batch_max_size = max_size
+        self.__batch_max_latency = max_latency
+    def flush(self, broadcast_class=None):
+        """Immediately broadcasts any samples accumulated for the specified broadcast class, or
+        for all broadcast classes if broadcast_class is None.
+        """
+        if broadcast_class is None:
+            broadcast_classes = list(self.__batches)
+        elif broadcast_class in self.__batches:
+            broadcast_classes = [broadcast_class]
+        else:
+            return
+        for broadcast_class in broadcast_classes:
+            (message, times, values, _) = self.__batches.pop(broadcast_class)
+            if len(times) == 1:
+                self.__send(message, broadcast_class)
+                continue
+            if isinstance(message, messages.Sample):
+                batch = messages.SampleBatch(message.type, times, values)
+            else:
+                batch = dict(message)
+                batch['time'] = np.array(times)
+                batch['data'] = np.array(values)
+            self.__send(batch, broadcast_class)
+    def _get_pending_deadline(self):
+        """Returns the time by which the oldest accumulated batch must be broadcast, or None if
+        no batch has a max_latency.
+        """
+        if self.__batch_max_latency is None or not self.__batches:
+            return None
+        return min(batch[3] for batch in self.__batches.values()) + self.__batch_max_latency
+    def _on_pending_deadline(self):
+        """Broadcasts all accumulated batches."""
+        self.flush()
+
     def broadcast(self, message, broadcast_class='all'):
-        """Broadcasts a message to all actors registered for the specified broadcast class."""
-        self.__logger.debug("%s: broadcasting to %s: %s", self, broadcast_class, message)
+        """Broadcasts a message to all actors registered for the specified broadcast class.
+        If batching is enabled, samples may be accumulated and broadcast later in a batch.
+        """
+        if self.__batch_max_size is not None or self.__batch_max_latency is not None:
+            if ('command' not in message and 'time' in message
+                    and not isinstance(message['time'], np.ndarray)):
+                self.__accumulate(message, broadcast_class)
+                return
+            self.flush(broadcast_class)
+        self.__send(message, broadcast_class)
+
+    def __accumulate(self, message, broadcast_class):
+        """Adds a sample to the batch for the broadcast class, and broadcasts the batch when it
+        is due.
+        """
+        clock = getattr(self, 'clock', None)
+        now = clock.now() if clock is not None else time.monotonic()
+        batch = self.__batches.get(broadcast_class)
+        if batch is None:
+            batch = (message, [], [], now)
+            self.__batches[broadcast_class] = batch
+        batch[1].append(message['time'])
+        batch[2].append(message['data'])
+        interval = now - self.__last_sample_times.get(broadcast_class, now)
+        self.__last_sample_times[broadcast_class] = now
+        if ((self.__batch_max_size is not None and len(batch[1]) >= self.__batch_max_size)
+                or (self.__batch_max_latency is not None
+                    and now + interval - batch[3] > self.__batch_max_latency)):
+            self.flush(broadcast_class)
+    def __send(self, message, broadcast_class):
+        """Sends a message to all actors registered for the specified broadcast class."""
+        if _tracer.enabled:
+            _tracer.trace(self, 'broadcasting', message, broadcast_class)
+        if instrumentation.enabled:
+            instrumentation.get_statistics(self).num_broadcast += 1
         for actor in self.__registry[broadcast_class]:
             actor.tell(message)
 
 class Producer(pykka.ThreadingActor):
     """Continuously outputs a stream of data samples at regular intervals.
+    Samples are produced at absolute deadlines on a monotonic clock, spaced apart by the interval,
+    so that the time taken to produce each sample does not lengthen the sampling period. If the
+    instance falls behind its deadlines, it handles the missed deadlines according to its
+    late_policy:
+        'catch up': produces samples for missed deadlines immediately until it catches up.
+        'skip': skips missed deadlines and waits for the next deadline which has not passed.
 
     Public Messages:
         Commands:
@@ -68,42 +203,159 @@ class Producer(pykka.ThreadingActor):
             stop producing: deactivates the instance to stop producing data samples. Only has an
             effect if the instance is currently producing data samples.
 
+    When the instance runs on a PooledRuntime, it waits for each deadline with a deferred message
+    instead of sleeping, so that it does not occupy a worker thread between samples.
+
+    The instance reads the time and waits for deadlines on its clock, which is a
+    clocks.RealClock unless another clock is specified, e.g. a clocks.VirtualClock to simulate
+    the instance faster than real time. On a clock which doesn't run in real time, the instance
+    waits for each deadline with a message scheduled on the clock.
+
     Abstract methods:
         _on_produce: a method that should be implemented to generate and emit a data sample.
         Called if (and only if) the instance is producing.
+        _get_next_deadline: hook returning the deadline following the specified deadline, for
+        instances which produce samples at irregular times. Defaults to the deadline plus the
+        interval. When deadlines are further apart than the interval, the instance sleeps for at
+        most the interval at a time, so that it still handles other messages, e.g. commands.
+        _get_pending_deadline: hook returning the time by which work held by the instance between
+        samples, e.g. accumulated batches of a Broadcaster, must be finished, or None. Defaults
+        to None.
+        _on_pending_deadline: hook to finish held work. Called before producing a sample if the
+        pending deadline has passed, right after producing a sample if the next sample is not due
+        before the pending deadline, and when the instance stops producing.
         _on_start_producing: hook for setup to be done when the instance starts producing.
         _on_stop_producing: hook for cleanup to be done when the instance stops producing.
     """
-    def __init__(self, interval=1):
+    def __init__(self, interval=1, late_policy='catch up', clock=None):
         super().__init__()
+        if clock is None:
+            clock = clocks.RealClock()
         self.interval = interval
+        self.late_policy = late_policy
+        self.clock = clock
         self.producing = False
         self.__logger = logging.getLogger(__name__)
+        self.__deadline = None
+        self.__produce_command = None
+        self.__reset_timing_statistics()
+        _tracer.refresh() # logging may have been configured after this module was imported
 
+    @instrumentation.instrumented
     def on_receive(self, message):
-        self.__logger.debug("Producer %s: received %s", self, message)
+        if message is self.__produce_command: # checked first, since it comes with every sample
+            self._produce()
+            return
+        if _tracer.enabled:
+            _tracer.trace(self, 'received', message)
         if not self.producing and message.get('command') == 'start producing':
+            _tracer.refresh()
             self.producing = True
             if 'interval' in message:
                 self.__logger.debug("Producer %s: setting interval to %s", self,
                                     message['interval'])
                 self.interval = message['interval']
             self._on_start_producing()
+            self.__reset_timing_statistics()
+            self.__deadline = self._get_next_deadline(self.clock.now())
+            # Each run recognizes its own produce command by identity, so that a command left over
+            # from a previous run cannot start a second chain of samples
+            self.__produce_command = {'command': 'produce'}
             self._produce()
         elif message.get('command') == 'stop producing':
+            if self.producing:
+                self.__timing_end = self.clock.now()
             self.producing = False
+            self._on_pending_deadline()
             self._on_stop_producing()
-        elif message.get('command') == 'produce':
-            self._produce()
     def _produce(self):
         if not self.producing:
             return
-        time.sleep(self.interval)
+        delay = self.__deadline - self.clock.now()
+        if delay > 0:
+            if not self.clock.real_time:
+                self.clock.send_after(delay, self.actor_ref, self.__produce_command)
+                return
+            tell_after = getattr(self.actor_ref, 'tell_after', None)
+            if tell_after is not None:
+                tell_after(delay, self.__produce_command)
+                return
+            if delay > self.interval: # handle other messages during long waits
+                self.clock.sleep(self.interval)
+                instrumentation.record_idle(self.interval)
+                self.actor_ref.tell(self.__produce_command)
+                return
+            self.clock.sleep(delay)
+            instrumentation.record_idle(delay)
+        now = self.clock.now()
+        self.__record_lateness(now - self.__deadline)
+        self.__check_pending_deadline(now)
         self._on_produce()
-        self.actor_ref.tell({'command': 'produce'})
+        self.__deadline = self._get_next_deadline(self.__deadline)
+        if self.late_policy == 'skip':
+            now = self.clock.now()
+            while self.__deadline < now:
+                self.__deadline = self._get_next_deadline(self.__deadline)
+                self.__num_skipped += 1
+        self.__check_pending_deadline(self.__deadline)
+        if not self.clock.real_time: # schedule the next deadline before the clock moves on
+            self.clock.send_after(self.__deadline - self.clock.now(), self.actor_ref,
+                                  self.__produce_command)
+            return
+        self.actor_ref.tell(self.__produce_command)
+
+    def get_timing_statistics(self):
+        """Returns statistics on how closely samples were produced to their deadlines.
+        Statistics are collected since the instance most recently started producing, until it
+        stopped producing.
+
+        Returns:
+            A dict with the following entries:
+            produced: the number of samples produced.
+            skipped: the number of deadlines skipped under the 'skip' late_policy.
+            achieved rate: the average number of samples produced per second.
+            mean lateness: the mean delay, in seconds, of producing each sample after its deadline.
+            jitter: the standard deviation of that delay, in seconds.
+        """
+        end = self.__timing_end if self.__timing_end is not None else self.clock.now()
+        elapsed = end - self.__timing_start
+        num_produced = self.__num_produced
+        return {
+            'produced': num_produced,
+            'skipped': self.__num_skipped,
+            'achieved rate': num_produced / elapsed if elapsed > 0 else float('nan'),
+            'mean lateness': self.__mean_lateness if num_produced else float('nan'),
+            'jitter': (math.sqrt(self.__lateness_squared_deviations / num_produced)
+                       if num_produced else float('nan'))
+        }
+    def __reset_timing_statistics(self):
+        """Clears the timing statistics."""
+        self.__timing_start = self.clock.now()
+        self.__timing_end = None
+        self.__num_produced = 0
+        self.__num_skipped = 0
+        self.__mean_lateness = 0.0
+        self.__lateness_squared_deviations = 0.0
+    def __check_pending_deadline(self, end_time):
+        """Finishes held work whose pending deadline is before end_time."""
+        pending_deadline = self._get_pending_deadline()
+        if pending_deadline is not None and pending_deadline < end_time:
+            self._on_pending_deadline()
+    def __record_lateness(self, lateness):
+        """Updates the timing statistics with Welford's algorithm."""
+        self.__num_produced += 1
+        delta = lateness - self.__mean_lateness
+        self.__mean_lateness += delta / self.__num_produced
+        self.__lateness_squared_deviations += delta * (lateness - self.__mean_lateness)
 
     def _on_produce(self):
         pass
+    def _get_next_deadline(self, deadline):
+        return deadline + self.interval
+    def _get_pending_deadline(self):
+        return None
+    def _on_pending_deadline(self):
+        pass
     def _on_start_producing(self):
         pass
     def _on_stop_producing(self):
@@ -118,3 +370,395 @@ class Printer(NamedActor, pykka.ThreadingActor):
     def on_receive(self, message):
         self.__logger.info("%s: received %s", self, message)
 
+
+OVERFLOW_POLICIES = ('drop oldest', 'keep latest', 'block')
+
+class BoundedInbox(queue.Queue):
+    """Actor mailbox which holds a limited number of messages.
+    When a data message arrives while the mailbox is full, the mailbox makes room according to
+    its overflow policy:
+        'drop oldest': discards the oldest waiting data messages.
+        'keep latest': discards all waiting data messages of the same type as the new one.
+        'block': makes the sender of the data message wait until the actor has handled enough
+        messages.
+    Only data messages are ever discarded or blocked; commands and messages awaiting replies are
+    always kept and added immediately, even if the mailbox then holds more messages than its
+    limit. The mailbox is unbounded until a limit is set.
+    """
+    def __init__(self):
+        super().__init__()
+        self.limit = None
+        self.overflow_policy = 'drop oldest'
+        self.num_dropped = 0
+
+    def set_limit(self, limit, overflow_policy='drop oldest'):
+        """Sets the maximum number of messages in the mailbox, or removes the limit if limit is
+        None.
+        """
+        if overflow_policy not in OVERFLOW_POLICIES:
+            raise ValueError("Unknown overflow policy \"{}\"".format(overflow_policy))
+        with self.mutex:
+            self.limit = limit
+            self.overflow_policy = overflow_policy
+            self.maxsize = limit if limit is not None and overflow_policy == 'block' else 0
+            self.not_full.notify_all()
+
+    def put(self, item, block=True, timeout=None):
+        """Adds an item to the mailbox. Under the 'block' policy, a data message waits while the
+        mailbox is full, but any other message is added immediately.
+        """
+        if self.overflow_policy == 'block' and _is_data(_unpack_inbox_item(item)):
+            super().put(item, block, timeout)
+            return
+        with self.mutex:
+            self._put(item)
+            self.unfinished_tasks += 1
+            self.not_empty.notify()
+
+    def _put(self, item):
+        if (self.limit is not None and self.overflow_policy != 'block'
+                and len(self.queue) >= self.limit and _is_data(_unpack_inbox_item(item))):
+            num_dropped = _make_room(self.queue, self.limit, item, self.overflow_policy,
+                                     _unpack_inbox_item)
+            self.num_dropped += num_dropped
+            self.unfinished_tasks -= num_dropped
+        super()._put(item)
+
+class BoundedMailbox(object):
+    """Mixin for pykka.ThreadingActor subclasses to give them a BoundedInbox, so that their
+    mailboxes can be limited by Broadcaster.register. Must precede pykka.ThreadingActor in the
+    base classes.
+    """
+    @staticmethod
+    def _create_actor_inbox():
+        return BoundedInbox()
+
+def _unpack_inbox_item(item):
+    """Returns the message of an item of a pykka mailbox, or None if it awaits a reply."""
+    if getattr(item, 'reply_to', None) is not None: # newer versions of pykka wrap messages
+        return None
+    return getattr(item, 'message', item)
+
+def _is_data(message):
+    """Returns whether a message is a data message which may be discarded."""
+    return (isinstance(message, (dict, messages.Sample)) and 'data' in message
+            and 'command' not in message and 'pykka_reply_to' not in message)
+
+def _make_room(mailbox, limit, new_item, overflow_policy, unpack):
+    """Discards data messages from a full mailbox to make room for a new data message.
+
+    Arguments:
+        mailbox: a deque of mailbox items.
+        unpack: a function which returns the message of a mailbox item, or None if the item must
+        be kept.
+
+    Returns:
+        The number of discarded messages.
+    """
+    if overflow_policy == 'keep latest':
+        message_type = unpack(new_item).get('type')
+        kept = [item for item in mailbox
+                if not _is_data(unpack(item)) or unpack(item).get('type') != message_type]
+    else:
+        num_excess = len(mailbox) - limit + 1
+        kept = []
+        for item in mailbox:
+            if num_excess > 0 and _is_data(unpack(item)):
+                num_excess -= 1
+            else:
+                kept.append(item)
+    num_dropped = len(mailbox) - len(kept)
+    if num_dropped:
+        mailbox.clear()
+        mailbox.extend(kept)
+    return num_dropped
+
+def start(actor_class, *args, runtime=None, **kwargs):
+    """Starts an actor on the specified PooledRuntime, or in its own thread if runtime is None.
+
+    Returns:
+        A reference to the actor.
+    """
+    if runtime is None:
+        return actor_class.start(*args, **kwargs)
+    return runtime.start(actor_class, *args, **kwargs)
+
+class PooledRuntime(object):
+    """Runs many lightweight actors on a small pool of shared worker threads.
+    A pykka.ThreadingActor occupies its own thread for its whole life, even though most actors
+    spend nearly all of that time waiting for messages. An actor class started on a
+    PooledRuntime instead, with runtime.start(actor_class, ...) in place of actor_class.start(...),
+    gets its own mailbox but only borrows a worker thread while it has messages to handle. Each
+    actor still handles its messages one at a time and in order, so actor classes need no changes.
+    The returned PooledActorRef supports the tell, ask, proxy, and stop methods used by this
+    package, so actors on the runtime can be registered with Broadcasters and can communicate
+    with threaded actors.
+
+    Arguments:
+        num_workers: the number of worker threads shared by the actors.
+        throughput: the maximum number of messages an actor handles before yielding its worker
+        thread to other actors with pending messages.
+    """
+    def __init__(self, num_workers=4, throughput=16):
+        super().__init__()
+        self.throughput = throughput
+        self.__executor = concurrent.futures.ThreadPoolExecutor(
+            num_workers, thread_name_prefix='PooledRuntime')
+        self.__timer = _DeferredMessages()
+        self.__actor_refs = []
+        self.__lock = threading.Lock()
+        self.__logger = logging.getLogger(__name__)
+
+    def start(self, actor_class, *args, **kwargs):
+        """Instantiates an actor class and starts the actor on the runtime.
+        The actor's on_start hook is called from a worker thread before it handles any messages.
+
+        Returns:
+            A PooledActorRef for the actor.
+        """
+        actor = actor_class(*args, **kwargs)
+        actor_ref = PooledActorRef(actor, self)
+        if isinstance(getattr(actor_class, 'actor_ref', None), property):
+            actor._actor_ref = actor_ref # newer versions of pykka make actor_ref read-only
+        else:
+            actor.actor_ref = actor_ref
+        with self.__lock:
+            self.__actor_refs.append(actor_ref)
+        actor_ref._post(_ProxyCall('on_start'))
+        self.__logger.debug("PooledRuntime: started %s", actor_ref)
+        return actor_ref
+    def stop_all(self, block=True, timeout=None):
+        """Stops all actors on the runtime, in the reverse of the order they were started.
+        If block is True, also shuts down the worker threads once the actors have stopped.
+        """
+        with self.__lock:
+            actor_refs = list(reversed(self.__actor_refs))
+            self.__actor_refs.clear()
+        stops = [actor_ref.stop(block=False) for actor_ref in actor_refs]
+        if block:
+            for stop in stops:
+                stop.get(timeout)
+            self.__timer.shutdown()
+            self.__executor.shutdown(wait=True)
+
+    def _submit(self, task):
+        self.__executor.submit(task)
+    def _defer(self, delay, actor_ref, message):
+        self.__timer.post(delay, actor_ref, message)
+
+class PooledActorRef(object):
+    """Reference to an actor running on a PooledRuntime.
+    Provides the same methods as pykka.ActorRef for sending messages to the actor, plus tell_after
+    for delivering a message after a delay without occupying a thread while waiting.
+    """
+    def __init__(self, actor, runtime):
+        super().__init__()
+        self.actor_class = actor.__class__
+        self.__actor = actor
+        self.__runtime = runtime
+        self.__mailbox = collections.deque()
+        self.__lock = threading.Lock()
+        self.__scheduled = False
+        self.__alive = True
+        self.__mailbox_limit = None
+        self.__overflow_policy = 'drop oldest'
+        self.num_dropped = 0
+        self.__logger = logging.getLogger(__name__)
+
+    def __str__(self):
+        return "PooledActorRef ({})".format(self.__actor)
+    __repr__ = __str__
+
+    def is_alive(self):
+        """Returns whether the actor is still accepting messages."""
+        return self.__alive
+
+    def tell(self, message):
+        """Sends a message to the actor without waiting for it to be handled.
+
+        Exceptions:
+            pykka.ActorDeadError: the actor has been stopped.
+        """
+        self._post(message)
+    def tell_after(self, delay, message):
+        """Sends a message to the actor after the specified delay, in seconds."""
+        self.__runtime._defer(delay, self, message)
+    def ask(self, message, block=True, timeout=None):
+        """Sends a message to the actor and returns the result of its on_receive method.
+        If block is False, returns a future for the result instead of waiting for it.
+        """
+        future = _Future()
+        self._post(message, future)
+        return future.get(timeout) if block else future
+    def proxy(self):
+        """Returns a proxy for calling methods and getting and setting attributes of the actor."""
+        return _PooledActorProxy(self, self.__actor)
+    def mailbox_depth(self):
+        """Returns the number of messages waiting for the actor."""
+        return len(self.__mailbox)
+    def set_mailbox_limit(self, limit, overflow_policy='drop oldest'):
+        """Sets the maximum number of messages waiting for the actor, like BoundedInbox.
+        The 'block' policy is not supported, since a blocked sender on the runtime could be
+        holding the worker thread which the actor needs to make room.
+        """
+        if overflow_policy not in OVERFLOW_POLICIES or overflow_policy == 'block':
+            raise ValueError("Unsupported overflow policy \"{}\"".format(overflow_policy))
+        with self.__lock:
+            self.__mailbox_limit = limit
+            self.__overflow_policy = overflow_policy
+    def stop(self, block=True, timeout=None):
+        """Stops the actor after it has handled the messages already in its mailbox.
+        The actor's on_stop hook is called from a worker thread. If block is False, returns a
+        future which is set once the actor has stopped.
+
+        Returns:
+            True if the actor was stopped, or False if it had already been stopped.
+        """
+        future = _Future()
+        try:
+            self._post(_STOP, future)
+        except pykka.ActorDeadError:
+            future.set_result(False)
+        return future.get(timeout) if block else future
+
+    def _post(self, message, future=None):
+        with self.__lock:
+            if not self.__alive:
+                raise pykka.ActorDeadError("{} is stopped".format(self))
+            if (self.__mailbox_limit is not None and len(self.__mailbox) >= self.__mailbox_limit
+                    and future is None and _is_data(message)):
+                self.num_dropped += _make_room(self.__mailbox, self.__mailbox_limit,
+                                               (message, None), self.__overflow_policy,
+                                               _unpack_pooled_item)
+            self.__mailbox.append((message, future))
+            if self.__scheduled:
+                return
+            self.__scheduled = True
+        self.__runtime._submit(self.__run)
+    def __run(self):
+        """Handles a bounded number of messages from the mailbox on a worker thread."""
+        for _ in range(self.__runtime.throughput):
+            with self.__lock:
+                if not self.__mailbox:
+                    self.__scheduled = False
+                    return
+                (message, future) = self.__mailbox.popleft()
+            self.__handle(message, future)
+        self.__runtime._submit(self.__run) # yield the worker, keeping the actor scheduled
+    def __handle(self, message, future):
+        """Dispatches a message to the actor."""
+        try:
+            if message is _STOP:
+                result = self.__stop()
+            elif isinstance(message, _ProxyCall):
+                result = message.apply(self.__actor)
+            else:
+                result = self.__actor.on_receive(message)
+        except Exception as e:
+            self.__logger.exception("%s: failed to handle %s", self, message)
+            if future is not None:
+                future.set_exception(e)
+            return
+        if future is not None:
+            future.set_result(result)
+    def __stop(self):
+        """Stops the actor and discards any messages it has not handled."""
+        with self.__lock:
+            self.__alive = False
+            discarded = list(self.__mailbox)
+            self.__mailbox.clear()
+        for (_, future) in discarded:
+            if future is not None:
+                future.set_exception(pykka.ActorDeadError("{} is stopped".format(self)))
+        self.__actor.on_stop()
+        self.__logger.debug("PooledRuntime: stopped %s", self)
+        return True
+
+def _unpack_pooled_item(item):
+    """Returns the message of an item of a PooledActorRef mailbox, or None if it awaits a
+    reply.
+    """
+    (message, future) = item
+    return message if future is None else None
+
+class _Future(concurrent.futures.Future):
+    """Future with the get method of pykka futures."""
+    def get(self, timeout=None):
+        return self.result(timeout)
+
+class _ProxyCall(object):
+    """Message for a proxied method call or attribute access on an actor."""
+    __slots__ = ('name', 'args', 'kwargs', 'kind')
+    def __init__(self, name, args=(), kwargs=None, kind='call'):
+        self.name = name
+        self.args = args
+        self.kwargs = kwargs or {}
+        self.kind = kind
+
+    def apply(self, actor):
+        if self.kind == 'get':
+            return getattr(actor, self.name)
+        if self.kind == 'set':
+            return setattr(actor, self.name, self.args[0])
+        return getattr(actor, self.name)(*self.args, **self.kwargs)
+
+_STOP = object()
+
+class _PooledActorProxy(object):
+    """Proxy for an actor on a PooledRuntime, which turns method calls and attribute gets into
+    messages returning futures, and attribute sets into messages.
+    """
+    def __init__(self, actor_ref, actor):
+        object.__setattr__(self, '_PooledActorProxy__actor_ref', actor_ref)
+        object.__setattr__(self, '_PooledActorProxy__actor_class', actor.__class__)
+
+    def __getattr__(self, name):
+        if callable(getattr(self.__actor_class, name, None)):
+            return lambda *args, **kwargs: self.__send(_ProxyCall(name, args, kwargs))
+        return self.__send(_ProxyCall(name, kind='get'))
+    def __setattr__(self, name, value):
+        self.__send(_ProxyCall(name, (value,), kind='set'))
+
+    def __send(self, call):
+        future = _Future()
+        self.__actor_ref._post(call, future)
+        return future
+
+class _DeferredMessages(object):
+    """Delivers messages to actors after delays, all from a single timer thread."""
+    def __init__(self):
+        super().__init__()
+        self.__queue = []
+        self.__sequence = itertools.count() # breaks ties between messages with equal deadlines
+        self.__condition = threading.Condition()
+        self.__running = True
+        self.__thread = threading.Thread(target=self.__run, name='PooledRuntime timer',
+                                         daemon=True)
+        self.__thread.start()
+
+    def post(self, delay, actor_ref, message):
+        with self.__condition:
+            heapq.heappush(self.__queue, (time.monotonic() + delay, next(self.__sequence),
+                                          actor_ref, message))
+            self.__condition.notify()
+    def shutdown(self):
+        with self.__condition:
+            self.__running = False
+            self.__condition.notify()
+        self.__thread.join()
+
+    def __run(self):
+        while True:
+            with self.__condition:
+                while self.__running:
+                    delay = self.__queue[0][0] - time.monotonic() if self.__queue else None
+                    if delay is not None and delay <= 0:
+                        break
+                    self.__condition.wait(delay)
+                if not self.__running:
+                    return
+                (_, _, actor_ref, message) = heapq.heappop(self.__queue)
+            try:
+                actor_ref.tell(message)
+            except pykka.ActorDeadError:
+                pass
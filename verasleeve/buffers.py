@@ -0,0 +1,222 @@
+"""Support for storing samples of signals."""
+# Dependency imports
+import numpy as np
+
+class RingBuffer(object):
+    """A typed buffer of the most recent samples of a signal, stored in a preallocated NumPy array.
+    Once the buffer is full, appending a sample overwrites the oldest sample. Every sample is
+    written to two positions of the storage array, one capacity apart, so that the samples are
+    always available in chronological order as a contiguous view of the storage array.
+
+    Arguments:
+        capacity: the maximum number of samples to hold. If this is None, the buffer holds all
+        samples and its storage array grows geometrically as needed.
+        dtype: the NumPy data type of the samples.
+        sample_shape: the shape of each sample, e.g. (3,) for samples of a 3-channel signal.
+    """
+    def __init__(self, capacity=None, dtype=float, sample_shape=()):
+        super().__init__()
+        self.capacity = capacity
+        self.dtype = np.dtype(dtype)
+        self.sample_shape = tuple(sample_shape)
+        storage_size = 2 * capacity if capacity is not None else 16
+        self.__storage = np.empty((storage_size,) + self.sample_shape, dtype=self.dtype)
+        self.__start = 0
+        self.__length = 0
+
+    def __len__(self):
+        return self.__length
+
+    def __getitem__(self, index):
+        if isinstance(index, int):
+            if index < 0:
+                index += self.__length
+            if not 0 <= index < self.__length:
+                raise IndexError("RingBuffer index out of range")
+            return self.__storage[self.__start + index]
+        return self.view()[index]
+
+    def __iter__(self):
+        return iter(self.view())
+
+    def __array__(self, dtype=None, copy=None):
+        return self.snapshot() if dtype is None else self.snapshot().astype(dtype)
+
+    @property
+    def full(self):
+        """Whether appending a sample will overwrite the oldest sample."""
+        return self.capacity is not None and self.__length == self.capacity
+
+    def append(self, value):
+        """Adds a sample to the buffer in O(1) time."""
+        capacity = self.capacity
+        if capacity is None:
+            if self.__length == len(self.__storage):
+                self.__grow(self.__length + 1)
+            self.__storage[self.__length] = value
+            self.__length += 1
+            return
+        position = self.__start + self.__length
+        if position >= capacity:
+            position -= capacity
+        self.__storage[position] = value
+        self.__storage[position + capacity] = value
+        if self.__length < capacity:
+            self.__length += 1
+        else:
+            self.__start = self.__start + 1 if self.__start + 1 < capacity else 0
+    def extend(self, values):
+        """Adds a block of samples to the buffer, in chronological order."""
+        values = np.asarray(values, dtype=self.dtype)
+        num_values = len(values)
+        capacity = self.capacity
+        if capacity is None:
+            if self.__length + num_values > len(self.__storage):
+                self.__grow(self.__length + num_values)
+            self.__storage[self.__length:self.__length + num_values] = values
+            self.__length += num_values
+            return
+        if num_values >= capacity:
+            self.__storage[:capacity] = values[-capacity:]
+            self.__storage[capacity:] = values[-capacity:]
+            self.__start = 0
+            self.__length = capacity
+            return
+        positions = (self.__start + self.__length + np.arange(num_values)) % capacity
+        self.__storage[positions] = values
+        self.__storage[positions + capacity] = values
+        num_overwritten = max(0, self.__length + num_values - capacity)
+        self.__length = min(capacity, self.__length + num_values)
+        self.__start = (self.__start + num_overwritten) % capacity
+    def clear(self):
+        """Removes all samples from the buffer without releasing its storage."""
+        self.__start = 0
+        self.__length = 0
+
+    def view(self):
+        """Returns the samples as a contiguous array, in chronological order, without copying.
+        The view shares memory with the buffer, so its contents are only valid until the next
+        sample is added to the buffer.
+        """
+        return self.__storage[self.__start:self.__start + self.__length]
+    def snapshot(self):
+        """Returns a copy of the samples as an array, in chronological order."""
+        return self.view().copy()
+
+    def __grow(self, min_size):
+        """Reallocates the storage array of an unbounded buffer to hold at least min_size
+        samples.
+        """
+        storage_size = len(self.__storage)
+        while storage_size < min_size:
+            storage_size *= 2
+        storage = np.empty((storage_size,) + self.sample_shape, dtype=self.dtype)
+        storage[:self.__length] = self.__storage[:self.__length]
+        self.__storage = storage
+
+class SummaryPyramid(object):
+    """Stores the entire history of a signal at multiple resolutions, like the mipmaps of an image.
+    Level 0 holds every sample, and each bucket of level k + 1 summarizes two consecutive buckets
+    of level k by their start time, minimum, maximum, and mean, so that each bucket of level k
+    summarizes 2 ** k samples. All levels are updated incrementally as samples are added, in
+    amortized O(1) time per sample. Any range of the history can then be retrieved with a bounded
+    number of buckets, in time proportional to that number of buckets.
+    Samples must be added in chronological order.
+    """
+    def __init__(self):
+        super().__init__()
+        self.__times = None
+        self.__mins = None
+        self.__maxes = None
+        self.__means = None
+        self.clear()
+
+    def __len__(self):
+        return len(self.__times[0])
+
+    def append(self, time, value):
+        """Adds a sample to the history."""
+        self.__times[0].append(time)
+        self.__mins[0].append(value)
+        if not len(self.__times[0]) % 2:
+            self.__summarize()
+    def extend(self, times, values):
+        """Adds a block of samples to the history."""
+        self.__times[0].extend(times)
+        self.__mins[0].extend(values)
+        self.__summarize()
+    def clear(self):
+        """Removes all samples from the history."""
+        values = RingBuffer() # level 0 buckets each summarize a single sample
+        self.__times = [RingBuffer()]
+        self.__mins = [values]
+        self.__maxes = [values]
+        self.__means = [values]
+
+    def sample_time(self, index):
+        """Returns the time of the sample at the specified position in the history."""
+        return self.__times[0][index]
+    def summarize(self, start_time=None, end_time=None, max_buckets=1000):
+        """Summarizes the samples between start_time and end_time, inclusive.
+        Uses the finest level with at most max_buckets buckets over that time range (plus one
+        bucket summarizing any trailing samples not yet summarized at that level).
+        Returns a 5-tuple of arrays of the start times, minimums, maximums, and means of the
+        buckets, followed by the level of the buckets.
+        """
+        sample_times = self.__times[0].view()
+        start = 0 if start_time is None else np.searchsorted(sample_times, start_time, 'left')
+        end = (len(sample_times) if end_time is None
+               else np.searchsorted(sample_times, end_time, 'right'))
+        level = 0
+        while (end - start) > max_buckets << level and level + 1 < len(self.__times):
+            level += 1
+        bucket_start = start >> level
+        bucket_end = min(end >> level, len(self.__times[level]))
+        summary = (self.__times[level][bucket_start:bucket_end],
+                   self.__mins[level][bucket_start:bucket_end],
+                   self.__maxes[level][bucket_start:bucket_end],
+                   self.__means[level][bucket_start:bucket_end])
+        tail_start = max(start, bucket_end << level)
+        if tail_start < end: # summarize the trailing samples directly
+            tail = self.__mins[0][tail_start:end]
+            summary = (np.append(summary[0], sample_times[tail_start]),
+                       np.append(summary[1], np.min(tail)), np.append(summary[2], np.max(tail)),
+                       np.append(summary[3], np.mean(tail)))
+        else:
+            summary = tuple(array.copy() for array in summary)
+        return summary + (level,)
+    def envelope(self, start_time=None, end_time=None, max_points=2000):
+        """Returns x and y arrays for drawing the samples between start_time and end_time.
+        At most about max_points points are returned: samples are drawn directly if there are few
+        enough of them, and otherwise each bucket is drawn as its minimum and maximum, so that
+        spikes remain visible.
+        """
+        (times, mins, maxes, _, level) = self.summarize(start_time, end_time, max_points // 2)
+        if not level:
+            return (times, mins)
+        return (np.repeat(times, 2), np.column_stack((mins, maxes)).ravel())
+
+    def __summarize(self):
+        """Adds buckets to each level to summarize all complete pairs of buckets in the level
+        below.
+        """
+        level = 0
+        while len(self.__times[level]) >= 2:
+            if level + 1 == len(self.__times):
+                self.__times.append(RingBuffer())
+                self.__mins.append(RingBuffer())
+                self.__maxes.append(RingBuffer())
+                self.__means.append(RingBuffer())
+            num_summarized = len(self.__times[level + 1])
+            num_pairs = len(self.__times[level]) // 2
+            if num_summarized == num_pairs:
+                return
+            pairs = slice(2 * num_summarized, 2 * num_pairs)
+            self.__times[level + 1].extend(self.__times[level][pairs][::2])
+            mins = self.__mins[level][pairs]
+            self.__mins[level + 1].extend(np.minimum(mins[::2], mins[1::2]))
+            maxes = self.__maxes[level][pairs]
+            self.__maxes[level + 1].extend(np.maximum(maxes[::2], maxes[1::2]))
+            means = self.__means[level][pairs]
+            self.__means[level + 1].extend((means[::2] + means[1::2]) / 2)
+            level += 1
@@ -0,0 +1,106 @@
+"""Support for converting raw sensor readings into physical units.
+Calibrations are compiled once into NumPy arrays when they are created, and then convert single
+readings or whole arrays of readings at once, so that batches of samples and recorded data can be
+converted without a Python function call per reading.
+"""
+# Dependency imports
+import numpy as np
+
+class LinearCalibration(object):
+    """Converts raw readings linearly, as (raw - offset) / scale.
+
+    Arguments:
+        offset: the raw reading corresponding to zero.
+        scale: the change in raw reading per unit.
+    """
+    def __init__(self, offset, scale):
+        super().__init__()
+        self.offset = offset
+        self.scale = scale
+
+    def __call__(self, raw):
+        return np.subtract(raw, self.offset) / self.scale
+
+class PiecewiseCalibration(object):
+    """Converts raw readings by linear interpolation in a table of calibration points, like
+    np.interp. The table is compiled into the slope and intercept of each segment between
+    consecutive points, so that converting readings takes one binary search (with
+    np.searchsorted) and one multiply-add per reading.
+
+    Arguments:
+        table: a sequence of 2-tuples of raw readings and the corresponding values. The points
+        are sorted by raw reading; a table with a single point converts readings within the table
+        to its value, and repeated raw readings make a step, like np.interp.
+        left_limit: the value for readings below the table. Defaults to the first value.
+        right_limit: the value for readings above the table. Defaults to the last value.
+
+    Exceptions:
+        ValueError: the table is empty.
+    """
+    def __init__(self, table, left_limit=None, right_limit=None):
+        super().__init__()
+        if not len(table):
+            raise ValueError("A piecewise calibration table needs at least one point")
+        (raws, values) = (np.array(column, dtype=float) for column in zip(*table))
+        order = np.argsort(raws, kind='stable')
+        (raws, values) = (raws[order], values[order])
+        self.raws = raws
+        self.values = values
+        self.left_limit = values[0] if left_limit is None else left_limit
+        self.right_limit = values[-1] if right_limit is None else right_limit
+        if len(raws) == 1: # a single zero-width segment, which converts to the constant value
+            (raws, values) = (np.repeat(raws, 2), np.repeat(values, 2))
+        widths = np.diff(raws)
+        # Zero-width segments are steps, which convert to the value at their end
+        self.__slopes = np.divide(np.diff(values), widths,
+                                  out=np.zeros_like(widths), where=widths > 0)
+        self.__intercepts = np.where(widths > 0, values[:-1] - self.__slopes * raws[:-1],
+                                     values[1:])
+
+    def __call__(self, raw):
+        raw = np.asarray(raw, dtype=float)
+        segments = np.clip(np.searchsorted(self.raws, raw, 'right') - 1,
+                           0, len(self.__slopes) - 1)
+        values = raw * self.__slopes[segments] + self.__intercepts[segments]
+        values = np.where(raw < self.raws[0], self.left_limit,
+                          np.where(raw > self.raws[-1], self.right_limit, values))
+        return values[()]
+
+class SwitchedCalibration(object):
+    """Converts the readings of a pair of sensors which measure the same quantity over different
+    ranges into a single value, using the low-range sensor until its reading passes a transition
+    and the high-range sensor beyond it.
+
+    Arguments:
+        low_calibration: the calibration of the low-range sensor.
+        high_calibration: the calibration of the high-range sensor.
+        transition_raw: the highest raw reading of the low-range sensor which is used.
+    """
+    def __init__(self, low_calibration, high_calibration, transition_raw):
+        super().__init__()
+        self.low_calibration = low_calibration
+        self.high_calibration = high_calibration
+        self.transition_raw = transition_raw
+
+    def __call__(self, low_raw, high_raw):
+        return np.where(np.less_equal(low_raw, self.transition_raw),
+                        self.low_calibration(low_raw), self.high_calibration(high_raw))[()]
+
+class TupleCalibration(object):
+    """Converts tuples of raw readings from several sensors into tuples of values.
+    Each value is computed by a calibration from the raw readings at some positions of the tuple.
+    Arrays of tuples, with one tuple per row, are converted into arrays of tuples of values.
+
+    Arguments:
+        conversions: a sequence of 2-tuples, one per value, of a calibration and a tuple of the
+        positions of the raw readings to pass to the calibration.
+    """
+    def __init__(self, conversions):
+        super().__init__()
+        self.conversions = tuple((calibration, tuple(positions))
+                                 for (calibration, positions) in conversions)
+
+    def __call__(self, raw):
+        raw = np.asarray(raw, dtype=float)
+        return np.stack([calibration(*(raw[..., position] for position in positions))
+                         for (calibration, positions) in self.conversions], axis=-1)
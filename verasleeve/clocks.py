@@ -0,0 +1,88 @@
+"""Clocks for timing actors, which can be swapped to run programs in real or simulated time.
+Producers and the device actors built on them read the time and wait for deadlines through a
+clock instead of calling the time module directly. A RealClock runs in real time; a VirtualClock
+runs a discrete-event simulation, so that a whole session of monitoring the leg and driving the
+sleeve can be simulated deterministically and as fast as the computer allows:
+
+    clock = clocks.VirtualClock()
+    sleeve_controller = sleeve.AdditiveSleeveController.start(sleeve_servos, clock=clock)
+    sleeve_controller.ask({'command': 'start producing', 'interval': 0.05})
+    clock.run_for(600) # simulate ten minutes
+"""
+# Python imports
+import time
+import heapq
+import itertools
+import threading
+
+# Dependency imports
+import pykka
+
+class RealClock(object):
+    """Clock on the monotonic time of the system, in seconds."""
+    real_time = True
+
+    def now(self):
+        """Returns the current time."""
+        return time.monotonic()
+    def sleep(self, duration):
+        """Blocks the calling thread for the specified duration, in seconds."""
+        if duration > 0:
+            time.sleep(duration)
+
+class VirtualClock(object):
+    """Discrete-event clock whose time only advances when it is run.
+    Actors wait on the clock by scheduling messages to themselves with send_after instead of
+    sleeping. Running the clock delivers the scheduled messages in order of their times, with ties
+    delivered in the order they were scheduled, and moves the time to each message's time before
+    delivering it. Each message is delivered with ask, so that its actor finishes handling it,
+    and schedules its next message, before the clock moves on; so the times seen by the actors do
+    not depend on how fast they run.
+
+    Commands which make actors schedule messages, e.g. 'start producing', should be sent with ask
+    before running the clock, so that the messages are scheduled before the clock runs. Sleeping
+    on the clock returns immediately, since time only passes between scheduled messages.
+
+    Arguments:
+        start_time: the initial time of the clock, in seconds.
+    """
+    real_time = False
+
+    def __init__(self, start_time=0.0):
+        super().__init__()
+        self.__now = start_time
+        self.__schedule = []
+        self.__sequence = itertools.count()
+        self.__lock = threading.Lock()
+
+    def now(self):
+        """Returns the current time."""
+        return self.__now
+    def sleep(self, duration):
+        """Returns immediately; see the class documentation."""
+        pass
+
+    def send_after(self, delay, actor_ref, message):
+        """Schedules a message to be delivered to an actor after the specified delay."""
+        with self.__lock:
+            heapq.heappush(self.__schedule, (self.__now + max(delay, 0), next(self.__sequence),
+                                             actor_ref, message))
+
+    def run_until(self, end_time):
+        """Delivers all messages scheduled up to the specified time, including messages which
+        are scheduled while running, and then advances the clock to that time. Messages to
+        actors which have stopped are discarded.
+        """
+        while True:
+            with self.__lock:
+                if not self.__schedule or self.__schedule[0][0] > end_time:
+                    self.__now = max(self.__now, end_time)
+                    return
+                (self.__now, _, actor_ref, message) = heapq.heappop(self.__schedule)
+            try:
+                actor_ref.ask(message)
+            except pykka.ActorDeadError:
+                pass
+    def run_for(self, duration):
+        """Runs the clock for the specified duration, in seconds; see run_until."""
+        self.run_until(self.__now + duration)
@@ -1,23 +1,169 @@
 """Defines some actors for graphical interfaces."""
+# Python imports
+import threading
 
 # Dependency imports
+import numpy as np
 import pykka
+from pyqtgraph.Qt import QtCore
 
-class LabelUpdater(pykka.ThreadingActor):
+# Package imports
+from verasleeve import actors, clocks, instrumentation
+
+class RenderBridge(QtCore.QObject):
+    """Hands off widget updates from actor threads to the Qt main thread.
+    Qt widgets must only be modified from the Qt main thread, so actors post widget method calls
+    into the bridge's queue instead of calling them directly. A timer in the Qt main thread
+    periodically drains the queue and applies all pending updates, grouped by widget. Only the
+    most recent call of each method on each widget is kept, so updates which are superseded
+    before they can be drawn are never applied.
+    An update may carry the actor which posted it and the time entry of the most recent sample it
+    shows; the latency of displaying that sample is then recorded once the update is applied.
+    The bridge must be constructed in the Qt main thread.
+
+    Arguments:
+        interval: the time in seconds between drains of the queue.
+    """
+    def __init__(self, interval=1 / 60):
+        super().__init__()
+        self.__lock = threading.Lock()
+        self.__pending = {}
+        self.__timer = QtCore.QTimer(self)
+        self.__timer.timeout.connect(self.__drain)
+        self.__timer.start(int(interval * 1000))
+
+    def post(self, widget, method_name, *args, actor=None, sample_time=None):
+        """Queues a call of the specified method of the widget. Safe to call from any thread.
+        If actor and sample_time are not None, the display latency of the sample with time entry
+        sample_time is recorded for the actor after the call is applied. A call which supersedes
+        a pending call without specifying a sample time inherits the sample time of the pending
+        call, since the sample is still shown by the new call.
+        """
+        with self.__lock:
+            calls = self.__pending.setdefault(widget, {})
+            if sample_time is None and method_name in calls:
+                (_, actor, sample_time) = calls[method_name]
+            calls[method_name] = (args, actor, sample_time)
+
+    def __drain(self):
+        """Applies all pending updates. Called in the Qt main thread."""
+        with self.__lock:
+            (pending, self.__pending) = (self.__pending, {})
+        for (widget, calls) in pending.items():
+            for (method_name, (args, actor, sample_time)) in calls.items():
+                getattr(widget, method_name)(*args)
+                if actor is not None and sample_time is not None:
+                    instrumentation.record_latency(actor, sample_time)
+
+class LabelUpdater(actors.BoundedMailbox, pykka.ThreadingActor):
     """Updates a Qt label with sample data.
 
     Public Messages:
         Data (received):
             The data entry should specify the key of the entry holding the value of the data
             sample. This key will be printed with the data value.
+            For a batch data message, whose time and data entries are NumPy arrays, only the
+            value of the most recent sample is printed.
+        Command (received):
+            render: updates the label if samples were received since it was last updated and
+            display_interval has passed. Only needed if display_interval is not None; register
+            the LabelUpdater for the 'render' channel of a plotting.FrameClock so that the
+            summary of the last samples before the samples stop is still shown.
+
+    Arguments:
+        render_bridge: if not None, a RenderBridge through which the label is updated in the Qt
+        main thread. Otherwise, the label is updated directly from the actor's thread.
+        display_interval: if not None, the minimum time in seconds between updates of the label.
+        The label is then only updated upon a data message or render command received at least
+        display_interval after the previous update, instead of upon every data message.
+        aggregate: how to summarize the samples received since the previous update of the label:
+        None to print the most recent sample, or 'mean', 'min', or 'max' to print the mean,
+        minimum, or maximum of the samples, respectively.
+        clock: the clock on which display_interval is measured. Defaults to a clocks.RealClock.
     """
-    def __init__(self, label, label_name_override=None):
+    def __init__(self, label, label_name_override=None, render_bridge=None,
+                 display_interval=None, aggregate=None, clock=None):
         super().__init__()
+        if clock is None:
+            clock = clocks.RealClock()
+        self.clock = clock
         self.label = label
         self.label_name = label_name_override
+        self.render_bridge = render_bridge
+        self.display_interval = display_interval
+        self.aggregate = aggregate
+        self.__last_display_time = None
+        self.__latest_type = None
+        self.__latest_time = None
+        self.__clear_aggregate()
 
+    @instrumentation.instrumented
     def on_receive(self, message):
         """Slot that updates the text label with the next sample."""
-        label_name = message['type'] if self.label_name is None else self.label_name
-        self.label.setText("{}: {:.1f}".format(label_name, message['data']))
+        if 'command' in message:
+            if message['command'] == 'render' and self.__num_samples:
+                self.__update_label()
+            return
+        value = message['data']
+        sample_time = message['time']
+        if isinstance(sample_time, np.ndarray):
+            if not len(value):
+                return
+            self.__aggregate_batch(value)
+            sample_time = sample_time[-1]
+        else:
+            self.__aggregate_sample(value)
+        self.__latest_type = message['type']
+        self.__latest_time = sample_time
+        self.__update_label()
+
+    def __update_label(self):
+        """Shows the summary of the samples received since the previous update, unless the
+        previous update was less than display_interval ago.
+        """
+        if self.display_interval is not None:
+            now = self.clock.now()
+            if (self.__last_display_time is not None
+                    and now - self.__last_display_time < self.display_interval):
+                return
+            self.__last_display_time = now
+        label_name = self.__latest_type if self.label_name is None else self.label_name
+        text = "{}: {:.1f}".format(label_name, self.__get_aggregate())
+        self.__clear_aggregate()
+        if self.render_bridge is None:
+            self.label.setText(text)
+            instrumentation.record_latency(self, self.__latest_time)
+        else:
+            self.render_bridge.post(self.label, 'setText', text,
+                                    actor=self, sample_time=self.__latest_time)
 
+    def __aggregate_sample(self, value):
+        """Adds a sample to the summary of samples received since the previous update."""
+        self.__latest = value
+        self.__num_samples += 1
+        self.__sum += value
+        self.__min = min(self.__min, value)
+        self.__max = max(self.__max, value)
+    def __aggregate_batch(self, values):
+        """Adds a batch of samples to the summary of samples received since the previous update."""
+        self.__latest = values[-1]
+        self.__num_samples += len(values)
+        self.__sum += np.sum(values)
+        self.__min = min(self.__min, np.min(values))
+        self.__max = max(self.__max, np.max(values))
+    def __get_aggregate(self):
+        """Returns the summary of samples received since the previous update."""
+        if self.aggregate == 'mean':
+            return self.__sum / self.__num_samples
+        elif self.aggregate == 'min':
+            return self.__min
+        elif self.aggregate == 'max':
+            return self.__max
+        return self.__latest
+    def __clear_aggregate(self):
+        """Clears the summary of samples received since the previous update."""
+        self.__latest = None
+        self.__num_samples = 0
+        self.__sum = 0
+        self.__min = float('inf')
+        self.__max = float('-inf')
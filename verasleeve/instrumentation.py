@@ -0,0 +1,205 @@
+"""Support for measuring the performance of actors, to find the bottlenecks of actor graphs.
+Actors record statistics in a registry while instrumentation is enabled: the on_receive method of
+an actor is decorated with @instrumented to record the number of messages it handles, how long it
+takes to handle each message, and the depth of its mailbox; and display actors record the
+latency from the acquisition of each sample to its display with record_latency. Instrumentation
+is disabled by default, and then costs a single global lookup per message.
+"""
+# Python imports
+import time
+import math
+import threading
+import functools
+
+# Package imports
+from verasleeve import clocks
+
+# Durations are recorded in histograms of power-of-two buckets, starting from 10 us
+HISTOGRAM_RESOLUTION = 1e-5
+HISTOGRAM_BUCKETS = 24 # the last bucket holds all durations of about 80 s or more
+
+enabled = False
+_epoch = None
+_clock = clocks.RealClock()
+_registry = {}
+_registry_lock = threading.Lock()
+_handling = threading.local() # idle time within the message being handled by each thread
+
+class Histogram(object):
+    """Histogram of durations, with logarithmically-spaced buckets."""
+    def __init__(self):
+        super().__init__()
+        self.counts = [0] * HISTOGRAM_BUCKETS
+        self.count = 0
+        self.total = 0.0
+        self.max = 0.0
+
+    def record(self, duration):
+        """Adds a duration, in seconds, to the histogram."""
+        bucket = math.frexp(duration / HISTOGRAM_RESOLUTION)[1] if duration > 0 else 0
+        self.counts[min(max(bucket, 0), HISTOGRAM_BUCKETS - 1)] += 1
+        self.count += 1
+        self.total += duration
+        if duration > self.max:
+            self.max = duration
+
+    def mean(self):
+        return self.total / self.count if self.count else float('nan')
+    def percentile(self, percent):
+        """Returns an upper bound on the specified percentile of the durations, from the edge of
+        the bucket holding it.
+        """
+        if not self.count:
+            return float('nan')
+        rank = percent / 100 * self.count
+        cumulative_count = 0
+        for (bucket, count) in enumerate(self.counts):
+            cumulative_count += count
+            if cumulative_count >= rank:
+                return min(HISTOGRAM_RESOLUTION * 2 ** bucket, self.max)
+        return self.max
+
+    def summary(self):
+        """Returns a dict of the count, mean, median, 99th percentile, and maximum durations."""
+        return {
+            'count': self.count,
+            'mean': self.mean(),
+            'median': self.percentile(50),
+            '99th percentile': self.percentile(99),
+            'max': self.max
+        }
+
+class ActorStatistics(object):
+    """Statistics of the messages handled by an actor."""
+    def __init__(self, name):
+        super().__init__()
+        self.name = name
+        self.num_messages = 0
+        self.num_samples = 0
+        self.num_broadcast = 0
+        self.handling_times = Histogram()
+        self.mailbox_depth = 0
+        self.max_mailbox_depth = 0
+        self.latencies = Histogram()
+
+    def record_message(self, message, handling_time, mailbox_depth):
+        """Adds a handled message to the statistics."""
+        self.num_messages += 1
+        if 'data' in message:
+            sample_time = message['time']
+            self.num_samples += len(sample_time) if hasattr(sample_time, '__len__') else 1
+        self.handling_times.record(handling_time)
+        self.mailbox_depth = mailbox_depth
+        if mailbox_depth > self.max_mailbox_depth:
+            self.max_mailbox_depth = mailbox_depth
+
+    def summary(self):
+        """Returns a dict of the statistics."""
+        return {
+            'messages': self.num_messages,
+            'samples': self.num_samples,
+            'broadcast': self.num_broadcast,
+            'handling time': self.handling_times.summary(),
+            'mailbox depth': self.mailbox_depth,
+            'max mailbox depth': self.max_mailbox_depth,
+            'latency': self.latencies.summary()
+        }
+
+def enable():
+    """Starts recording statistics."""
+    global enabled
+    enabled = True
+def disable():
+    """Stops recording statistics."""
+    global enabled
+    enabled = False
+def reset():
+    """Removes all recorded statistics."""
+    with _registry_lock:
+        _registry.clear()
+
+def set_epoch(epoch, clock=None):
+    """Sets the time from which the time entries of data samples are measured, and the clock of
+    that time, so that the latency of samples can be computed from their time entries.
+
+    Arguments:
+        clock: the clock of the time entries. Defaults to a clocks.RealClock.
+    """
+    global _epoch, _clock
+    if clock is None:
+        clock = clocks.RealClock()
+    (_epoch, _clock) = (epoch, clock)
+
+def get_statistics(actor):
+    """Returns the ActorStatistics of an actor, adding it to the registry if needed."""
+    name = str(actor)
+    statistics = _registry.get(name)
+    if statistics is None:
+        with _registry_lock:
+            statistics = _registry.setdefault(name, ActorStatistics(name))
+    return statistics
+def get_summary():
+    """Returns a dict of the summaries of the statistics of all actors in the registry, keyed by
+    the names of the actors.
+    """
+    with _registry_lock:
+        return {name: statistics.summary() for (name, statistics) in _registry.items()}
+def format_summary():
+    """Returns a one-line description of the bottlenecks of the actors in the registry."""
+    with _registry_lock:
+        all_statistics = [statistics for statistics in _registry.values()
+                          if statistics.num_messages]
+    if not all_statistics:
+        return "No statistics recorded"
+    busiest = max(all_statistics,
+                  key=lambda statistics: statistics.handling_times.total)
+    deepest = max(all_statistics, key=lambda statistics: statistics.max_mailbox_depth)
+    description = ("Busiest: {} ({:.2f} ms/message); deepest mailbox: {} ({} messages)"
+                   .format(busiest.name, 1000 * busiest.handling_times.mean(),
+                           deepest.name, deepest.max_mailbox_depth))
+    latencies = [statistics.latencies for statistics in all_statistics
+                 if statistics.latencies.count]
+    if latencies:
+        description += "; max display latency: {:.0f} ms".format(
+            1000 * max(latency.percentile(99) for latency in latencies))
+    return description
+
+def instrumented(on_receive):
+    """Method decorator for the on_receive method of an actor, to record statistics of the
+    messages it handles while instrumentation is enabled.
+    """
+    @functools.wraps(on_receive)
+    def _wrapper(self, message):
+        if not enabled:
+            return on_receive(self, message)
+        outer_idle_time = getattr(_handling, 'idle_time', 0.0)
+        _handling.idle_time = 0.0
+        start_time = time.perf_counter()
+        try:
+            return on_receive(self, message)
+        finally:
+            handling_time = time.perf_counter() - start_time - _handling.idle_time
+            _handling.idle_time += outer_idle_time
+            get_statistics(self).record_message(message, handling_time, _get_mailbox_depth(self))
+    return _wrapper
+
+def record_idle(duration):
+    """Excludes time spent waiting, e.g. sleeping until a deadline, from the handling time of
+    the message being handled by the calling thread.
+    """
+    if enabled:
+        _handling.idle_time = getattr(_handling, 'idle_time', 0.0) + duration
+
+def record_latency(actor, sample_time):
+    """Records the latency of displaying a sample with the specified time entry, if
+    instrumentation is enabled and the epoch of the time entries has been set.
+    """
+    if enabled and _epoch is not None:
+        get_statistics(actor).latencies.record(_clock.now() - _epoch - sample_time)
+
+def _get_mailbox_depth(actor):
+    """Returns the number of messages waiting in the mailbox of an actor."""
+    actor_ref = actor.actor_ref
+    if hasattr(actor_ref, 'mailbox_depth'):
+        return actor_ref.mailbox_depth()
+    return actor.actor_inbox.qsize()
@@ -1,26 +1,67 @@
 """Controls the Arduino board of the leg model test fixture."""
 # Python imports
 import time
+import struct
+import logging
+import threading
 
 # Dependency imports
+import numpy as np
 import nanpy
+from nanpy.arduinoboard import FirmwareClass, arduinomethod
+from nanpy.classinfo import check4firmware
+import serial
 from serial.serialutil import SerialException
 import pykka
 
 # Package imports
-from verasleeve import actors
+from verasleeve import actors, calibration, instrumentation, messages
 
 # Device parameters
 # These are analog pins, and must be specified without an 'A' prefix as in 'A0'.
 TOP_LOW_FLUID_SENSOR_PIN = 0
 TOP_HIGH_FLUID_SENSOR_PIN = 1
 BOTTOM_FLUID_SENSOR_PIN = 2
+FLUID_SENSOR_PINS = (TOP_LOW_FLUID_SENSOR_PIN, TOP_HIGH_FLUID_SENSOR_PIN, BOTTOM_FLUID_SENSOR_PIN)
 
 # Default unit conversion functions for sensors
-TOP_LOW_FLUID_PRESSURE_RAW_TO_MMHG = lambda raw: (raw - 499.435) / 8.266
-TOP_HIGH_FLUID_PRESSURE_RAW_TO_MMHG = lambda raw: (raw - 111.514) / 2.723
+TOP_LOW_FLUID_PRESSURE_RAW_TO_MMHG = calibration.LinearCalibration(499.435, 8.266)
+TOP_HIGH_FLUID_PRESSURE_RAW_TO_MMHG = calibration.LinearCalibration(111.514, 2.723)
 TOP_LOW_HIGH_FLUID_PRESSURE_TRANSITION_RAW = 900 # raw value where the low fluid sensor is at limit
-BOTTOM_FLUID_PRESSURE_RAW_TO_MMHG = lambda raw: (raw - 105.287) / 2.729
+BOTTOM_FLUID_PRESSURE_RAW_TO_MMHG = calibration.LinearCalibration(105.287, 2.729)
+
+# Streaming acquisition parameters
+# These must match the LegStreaming sketch.
+STREAM_BAUDRATE = 115200
+STREAM_INTERVAL = 0.002 # s between samples taken by the board, if no interval is specified
+STREAM_FRAME_START = b'\xa5\x5a'
+STREAM_FRAME_DTYPE = np.dtype([
+    ('start', 'u1', (2,)),
+    ('sequence', '<u2'), # wraps around
+    ('time', '<u4'), # micros() on the board, which wraps around
+    ('readings', '<u2', (len(FLUID_SENSOR_PINS),)),
+    ('checksum', 'u1') # sum of the sequence, time, and readings bytes
+])
+STREAM_READ_TIMEOUT = 0.1 # s that the reader thread waits for data before checking for stops
+
+@check4firmware
+class AnalogArray(FirmwareClass):
+    """Reads several analog pins of the Arduino with a single request and response, instead of
+    one round trip over the serial connection per pin.
+    Requires the AnalogArray class in the nanpy firmware, from ext/nanpy-firmware-classes.
+    """
+    firmware_id = 'AnalogArray'
+
+    @arduinomethod
+    def read(self, *pins):
+        """Returns the raw readings of the specified pins as a string of space-separated
+        integers.
+        """
+        pass
+
+    def read_pins(self, pins):
+        """Returns a tuple of the raw readings of the specified pins."""
+        return tuple(int(reading) for reading in self.read(*pins).split())
 
 class Leg(object):
     """Models the Arduino controller of the leg model test fixture."""
@@ -37,8 +78,25 @@ class Leg(object):
             raise RuntimeError("Could not connect to the Arduino!") from None
         except nanpy.classinfo.FirmwareError:
             raise RuntimeError("Could not find correct Nanpy firmware on the Arduino!") from None
+        try:
+            self._analog_array = AnalogArray(connection=connection)
+        except nanpy.classinfo.FirmwareError:
+            self._analog_array = None
         self.connection_device = connection.device
 
+    def get_fluid_pressure_sensors(self):
+        """Read from all fluid pressure sensors at once.
+        Takes a single round trip to the Arduino if its firmware has the AnalogArray class, and
+        otherwise falls back to reading the sensors one at a time.
+
+        Returns:
+            A 3-tuple of the readings from the top low-range, top high-range, and bottom sensors.
+        """
+        if self._analog_array is None:
+            return (self.get_top_low_fluid_pressure_sensor(),
+                    self.get_top_high_fluid_pressure_sensor(),
+                    self.get_bottom_fluid_pressure_sensor())
+        return self._analog_array.read_pins(FLUID_SENSOR_PINS)
     def get_top_low_fluid_pressure_sensor(self):
         """Read from the sensitive (low-range) fluid pressure sensor above the vein."""
         return self._board.analogRead(TOP_LOW_FLUID_SENSOR_PIN)
@@ -61,11 +119,12 @@ class LegMonitor(actors.Broadcaster, actors.Producer):
             e.g. 'fluid pressure'.
             The type entry specifies the type of data message, while the data entry holds
             the value of the data sample.
-            fluid pressure: 2-tuple of the raw readings from the low and high fluid pressure
-            sensors, respectively.
+            fluid pressure: 3-tuple of the raw readings from the top low-range, top high-range,
+            and bottom fluid pressure sensors, respectively.
+            Data messages are broadcast as messages.Sample instances.
     """
-    def __init__(self, leg=None):
-        super().__init__()
+    def __init__(self, leg=None, clock=None):
+        super().__init__(clock=clock)
         if leg is None:
             leg = Leg()
         self.__leg = leg
@@ -73,19 +132,234 @@ class LegMonitor(actors.Broadcaster, actors.Producer):
         self.__produce_start_time = None
 
     def _on_start_producing(self):
-        self.__produce_start_time = time.time()
+        self.__produce_start_time = self.clock.now()
+        instrumentation.set_epoch(self.__produce_start_time, self.clock)
     def _on_stop_producing(self):
         self.__produce_start_time = None
     def _on_produce(self):
-        self.broadcast({'type': 'fluid pressure',
-                        'time': self.__time_since_produce_start(),
-                        'data': (self.__leg.get_top_low_fluid_pressure_sensor(),
-                                 self.__leg.get_top_high_fluid_pressure_sensor(),
-                                 self.__leg.get_bottom_fluid_pressure_sensor())},
+        self.broadcast(messages.Sample('fluid pressure', self.__time_since_produce_start(),
+                                       self.__leg.get_fluid_pressure_sensors()),
                        'fluid pressure')
 
     def __time_since_produce_start(self):
-        return time.time() - self.__produce_start_time
+        return self.clock.now() - self.__produce_start_time
+
+class StreamFrameParser(object):
+    """Parses the binary frames of fluid pressure readings streamed by the LegStreaming sketch.
+    Parses all the complete frames in the received data at once with NumPy, and keeps any
+    incomplete frame at the end until the rest of it is received. Bytes which are not part of a
+    valid frame, e.g. from connecting in the middle of a frame, are skipped up to the next frame
+    start marker.
+
+    Attributes:
+        num_dropped: the number of frames missing from the sequence numbers of the parsed frames,
+        e.g. because the board missed a sampling deadline.
+        num_skipped_bytes: the number of received bytes which were not part of a valid frame.
+    """
+    def __init__(self):
+        super().__init__()
+        self.__buffer = bytearray()
+        self.__last_sequence = None
+        self.__last_board_time = None
+        self.__elapsed_time = 0 # us since the first frame
+        self.num_dropped = 0
+        self.num_skipped_bytes = 0
+
+    def parse(self, data):
+        """Parses newly received data.
+
+        Returns:
+            A 2-tuple of a 1-D array of the times of the parsed frames, in seconds since the
+            first parsed frame on the clock of the board, and a 2-D array of the raw readings
+            of the parsed frames, with one row per frame.
+        """
+        self.__buffer += data
+        frames = []
+        corrupted = True
+        while corrupted: # continue after each invalid frame
+            (valid_frames, corrupted) = self.__parse_buffer()
+            frames.append(valid_frames)
+        frames = np.concatenate(frames)
+        return (self.__get_times(frames), frames['readings'])
+
+    def __parse_buffer(self):
+        """Parses the valid frames at the start of the buffer, up to the first invalid one.
+
+        Returns:
+            A 2-tuple of the array of valid frames and whether an invalid frame was found.
+        """
+        start = self.__buffer.find(STREAM_FRAME_START)
+        if start < 0: # keep a trailing byte which may begin the next frame start marker
+            start = len(self.__buffer) - int(self.__buffer.endswith(STREAM_FRAME_START[:1]))
+        self.num_skipped_bytes += start
+        del self.__buffer[:start]
+        frame_size = STREAM_FRAME_DTYPE.itemsize
+        num_frames = len(self.__buffer) // frame_size
+        frames = np.frombuffer(bytes(self.__buffer[:num_frames * frame_size]),
+                               dtype=STREAM_FRAME_DTYPE)
+        frame_bytes = frames.view(np.uint8).reshape(num_frames, frame_size)
+        valid = ((frame_bytes[:, 0] == STREAM_FRAME_START[0])
+                 & (frame_bytes[:, 1] == STREAM_FRAME_START[1])
+                 & (frame_bytes[:, 2:-1].sum(axis=1, dtype=np.uint8) == frame_bytes[:, -1]))
+        num_valid = num_frames if valid.all() else int(np.argmin(valid))
+        del self.__buffer[:num_valid * frame_size]
+        if num_valid < num_frames: # skip the start marker of the invalid frame
+            del self.__buffer[:1]
+            self.num_skipped_bytes += 1
+        return (frames[:num_valid], num_valid < num_frames)
+    def __get_times(self, frames):
+        """Returns the times of the frames, and counts the frames missing between them."""
+        if not len(frames):
+            return np.empty(0)
+        sequences = frames['sequence'].astype(np.int64)
+        board_times = frames['time'].astype(np.int64)
+        if self.__last_sequence is None:
+            (self.__last_sequence, self.__last_board_time) = (sequences[0] - 1, board_times[0])
+        sequence_steps = np.diff(sequences, prepend=self.__last_sequence) % 2 ** 16
+        self.num_dropped += int(np.sum(sequence_steps - 1))
+        elapsed_times = (self.__elapsed_time
+                         + np.cumsum(np.diff(board_times, prepend=self.__last_board_time)
+                                     % 2 ** 32))
+        (self.__last_sequence, self.__last_board_time) = (sequences[-1], board_times[-1])
+        self.__elapsed_time = elapsed_times[-1]
+        return elapsed_times / 1e6
+
+class StreamingLeg(object):
+    """Models the Arduino of the leg model test fixture running the LegStreaming sketch, which
+    samples the fluid pressure sensors on its own timer and streams the readings in binary frames.
+
+    Arguments:
+        device: the path of the serial port of the Arduino.
+        connection: an open serial.Serial connection to use instead of opening the device.
+    """
+    def __init__(self, device=None, baudrate=STREAM_BAUDRATE, connection=None):
+        super().__init__()
+        if connection is None:
+            try:
+                connection = serial.Serial(device, baudrate, timeout=STREAM_READ_TIMEOUT)
+            except SerialException:
+                raise RuntimeError("Could not open a serial connection!") from None
+        self.__connection = connection
+        self.parser = StreamFrameParser()
+        self.connection_device = connection.port
+
+    def start_streaming(self, interval=STREAM_INTERVAL):
+        """Makes the board start streaming, with the specified interval in seconds between
+        samples. Discards any previously received data.
+        """
+        self.__connection.reset_input_buffer()
+        self.parser = StreamFrameParser()
+        self.__connection.write(b'S' + struct.pack('<I', int(round(interval * 1e6))))
+    def stop_streaming(self):
+        """Makes the board stop streaming."""
+        self.__connection.write(b'X')
+    def read_samples(self):
+        """Waits for data from the board, up to the read timeout of the connection, and parses
+        all received frames.
+
+        Returns:
+            A 2-tuple of arrays of the times and raw readings of the samples; see
+            StreamFrameParser.parse. The arrays are empty if no complete frames were received.
+        """
+        data = self.__connection.read(max(1, self.__connection.in_waiting))
+        return self.parser.parse(data)
+    def close(self):
+        """Closes the serial connection."""
+        self.__connection.close()
+
+class LegStreamMonitor(actors.Broadcaster, pykka.ThreadingActor):
+    """An actor to interface between a StreamingLeg instance and other actors.
+    Accepts the same commands as a LegMonitor, but instead of polling the board for each sample,
+    makes the board sample its sensors on its own timer. While the instance is producing, a reader
+    thread parses the streamed frames as they arrive, and sends each group of frames to the
+    instance as a batch, which it broadcasts.
+
+    Public Messages:
+        Commands:
+            start producing: makes the board start streaming samples. Only has an effect if the
+            instance is not currently producing data samples.
+                interval: optional attribute. If provided, sets the interval in seconds between
+                samples taken by the board.
+            stop producing: makes the board stop streaming samples. Only has an effect if the
+            instance is currently producing data samples.
+        Command (broadcasted):
+            connection lost: broadcasted on the 'connection lost' channel if the serial
+            connection to the board fails while the instance is producing, after which the
+            instance stops producing. The error entry describes the failure, which is also kept
+            in the instance's error attribute.
+        Data (broadcasted):
+            fluid pressure: messages.SampleBatch instances of the raw readings from the top
+            low-range, top high-range, and bottom fluid pressure sensors, with one row of
+            readings per sample. The time entries are the times since the board started
+            streaming, on the clock of the board.
+    """
+    def __init__(self, streaming_leg, interval=STREAM_INTERVAL):
+        super().__init__()
+        self.__leg = streaming_leg
+        self.connection_device = streaming_leg.connection_device
+        self.interval = interval
+        self.producing = False
+        self.__logger = logging.getLogger(__name__)
+        self.__reader = None
+        self.__reading = threading.Event()
+        self.error = None
+
+    @instrumentation.instrumented
+    def on_receive(self, message):
+        if isinstance(message, messages.SampleBatch):
+            self.broadcast(message, 'fluid pressure')
+        elif not self.producing and message.get('command') == 'start producing':
+            self.interval = message.get('interval', self.interval)
+            self.__start_reading()
+        elif self.producing and message.get('command') == 'stop producing':
+            self.__stop_reading()
+        elif self.producing and message.get('command') == 'connection lost':
+            self.error = message['error']
+            self.__stop_reading()
+            self.broadcast(message, 'connection lost')
+
+    def get_stream_statistics(self):
+        """Returns a dict of the numbers of frames dropped and bytes skipped in the stream."""
+        return {
+            'dropped': self.__leg.parser.num_dropped,
+            'skipped bytes': self.__leg.parser.num_skipped_bytes
+        }
+
+    def on_stop(self):
+        if self.producing:
+            self.__stop_reading()
+        self.__leg.close()
+
+    def __start_reading(self):
+        self.producing = True
+        self.error = None
+        self.__leg.start_streaming(self.interval)
+        instrumentation.set_epoch(time.monotonic())
+        self.__reading.set()
+        self.__reader = threading.Thread(target=self.__read, daemon=True,
+                                         name='{} reader'.format(self))
+        self.__reader.start()
+    def __stop_reading(self):
+        self.producing = False
+        self.__reading.clear()
+        self.__reader.join()
+        try:
+            self.__leg.stop_streaming()
+        except OSError:
+            self.__logger.warning("Could not tell the leg to stop streaming")
+        self.flush()
+    def __read(self):
+        """Sends batches of streamed samples to the instance until reading stops."""
+        actor_ref = self.actor_ref
+        while self.__reading.is_set():
+            try:
+                (times, readings) = self.__leg.read_samples()
+            except OSError as e: # pyserial raises SerialException or OSError
+                self.__logger.exception("Lost the serial connection to the leg")
+                actor_ref.tell({'command': 'connection lost', 'error': str(e)})
+                return
+            if len(times):
+                actor_ref.tell(messages.SampleBatch('fluid pressure', times, readings))
 
 class LegUnitConverter(actors.Broadcaster, pykka.ThreadingActor):
     """Converts raw sensor value data from a LegMonitor into physical units.
@@ -100,6 +374,9 @@ class LegUnitConverter(actors.Broadcaster, pykka.ThreadingActor):
             fluid pressure: 3-tuple of the raw readings from the low and high fluid pressure
             sensors at the top of the vein and the fluid pressure sensor at the bottom of the vein,
             respectively.
+            A batch of samples can be sent in a single data message whose time and data entries
+            are NumPy arrays, with one row of raw readings per sample. It is converted and
+            broadcast as a batch.
         Data (broadcasted):
             Data messages have a time entry holding the time since the producer started
             emitting messages at which the data sample was recorded. Each data message is
@@ -114,24 +391,34 @@ class LegUnitConverter(actors.Broadcaster, pykka.ThreadingActor):
                  top_high_raw_to_fluid_pressure=TOP_HIGH_FLUID_PRESSURE_RAW_TO_MMHG,
                  bottom_raw_to_fluid_pressure=BOTTOM_FLUID_PRESSURE_RAW_TO_MMHG):
         super().__init__()
-        self.__top_low_raw_to_fluid_pressure = top_low_raw_to_fluid_pressure
-        self.__top_high_raw_to_fluid_pressure = top_high_raw_to_fluid_pressure
-        self.__bottom_raw_to_fluid_pressure = bottom_raw_to_fluid_pressure
+        self.__fluid_pressure_calibration = get_fluid_pressure_calibration(
+            top_low_raw_to_fluid_pressure, top_high_raw_to_fluid_pressure,
+            bottom_raw_to_fluid_pressure)
 
+    @instrumentation.instrumented
     def on_receive(self, message):
         self.__on_data(message)
 
     def __on_data(self, message):
         """Processes data messages."""
-        new_message = dict(message)
+        new_message = message.copy()
         if message['type'] == 'fluid pressure':
-            new_message['data'] = (self.__top_raw_to_fluid_pressure(message['data'][0],
-                                                                    message['data'][1]),
-                                   self.__bottom_raw_to_fluid_pressure(message['data'][2]))
+            new_message['data'] = self.__fluid_pressure_calibration(message['data'])
         self.broadcast(new_message, new_message['type'])
-    def __top_raw_to_fluid_pressure(self, top_low_raw, top_high_raw):
-        if top_low_raw <= TOP_LOW_HIGH_FLUID_PRESSURE_TRANSITION_RAW:
-            return self.__top_low_raw_to_fluid_pressure(top_low_raw)
-        else:
-            return self.__top_high_raw_to_fluid_pressure(top_high_raw)
+
+def get_fluid_pressure_calibration(
+        top_low_raw_to_fluid_pressure=TOP_LOW_FLUID_PRESSURE_RAW_TO_MMHG,
+        top_high_raw_to_fluid_pressure=TOP_HIGH_FLUID_PRESSURE_RAW_TO_MMHG,
+        bottom_raw_to_fluid_pressure=BOTTOM_FLUID_PRESSURE_RAW_TO_MMHG):
+    """Returns a calibration.TupleCalibration which converts the 3-tuples of raw fluid pressure
+    readings broadcast by a LegMonitor, or arrays of them, into fluid pressures at the top and
+    bottom of the vein in mmHg. The conversion functions must accept NumPy arrays.
+    """
+    top_raw_to_fluid_pressure = calibration.SwitchedCalibration(
+        top_low_raw_to_fluid_pressure, top_high_raw_to_fluid_pressure,
+        TOP_LOW_HIGH_FLUID_PRESSURE_TRANSITION_RAW)
+    return calibration.TupleCalibration((
+        (top_raw_to_fluid_pressure, (0, 1)),
+        (bottom_raw_to_fluid_pressure, (2,))
+    ))
 
@@ -4,14 +4,16 @@
 import sys
 import os
 import logging
+from functools import partial
 
 # Dependency imports
+import numpy as np
 import pykka
 import pyqtgraph as pg
-from pyqtgraph.Qt import uic, QtGui
+from pyqtgraph.Qt import uic, QtCore, QtGui
 
 # Package imports
-from verasleeve import leg, signal, plotting, gui
+from verasleeve import actors, instrumentation, leg, signal, plotting, gui
 
 logging.basicConfig(level=logging.INFO)
 
@@ -22,10 +24,51 @@ TOP_FLUID_PRESSURE_MAX = 60
 BOTTOM_FLUID_PRESSURE_MIN = 30
 BOTTOM_FLUID_PRESSURE_MAX = 90
 
+LABEL_DISPLAY_INTERVAL = 0.2 # labels are updated at 5 Hz, regardless of the sample rate
+# If not None, the monitor's actors share this many worker threads instead of one thread each
+ACTOR_RUNTIME_WORKERS = None
+# Samples are sent down the pipeline in batches, which are held for at most one frame
+SAMPLE_BATCH_MAX_SIZE = 64
+SAMPLE_BATCH_MAX_LATENCY = 1 / 30
+# Display actors which fall behind discard samples rather than queueing them without bound
+# Labels which summarize samples (e.g. max and min labels) must receive every sample, so they are
+# not limited
+CURVE_MAILBOX_LIMIT = 256
+LABEL_MAILBOX_LIMIT = 4
+# If not None, the interval in seconds at which actor performance statistics are shown
+INSTRUMENTATION_INTERVAL = None
+
 class LegMonitorPanel(QtGui.QMainWindow):
-    def __init__(self, update_interval, filter_width, graph_width):
+    """Displays plots and values of the leg model's sensor readings.
+
+    Arguments:
+        graph_width: the number of samples shown in each plot if graph_duration is None.
+        Otherwise, the number of pixel columns across which each plot shows graph_duration.
+        frame_rate: the rate at which plots are redrawn.
+        graph_duration: if not None, the time in seconds shown in each plot. Samples are then
+        decimated to the minimum and maximum of each pixel column, so the number of points drawn
+        stays bounded however long graph_duration is.
+        history: if True, each curve stores its entire history at multiple resolutions, so that
+        plots can be panned and zoomed over the entire monitoring session.
+        actor_runtime: if not None, the actors.PooledRuntime on which to run the panel's actors.
+        Otherwise, each actor runs in its own thread.
+        instrumentation_interval: if not None, the panel's actors are instrumented, and the
+        status bar shows a summary of their bottlenecks while monitoring, updated at this
+        interval in seconds. The full statistics are available from
+        instrumentation.get_summary.
+    """
+    def __init__(self, update_interval, filter_width, graph_width, frame_rate=30,
+                 graph_duration=None, history=False, actor_runtime=None,
+                 instrumentation_interval=None):
         super().__init__()
         self.update_interval = update_interval
+        self.__actor_runtime = actor_runtime
+        self.__instrumentation_timer = None
+        if instrumentation_interval is not None:
+            instrumentation.enable()
+            self.__instrumentation_timer = QtCore.QTimer()
+            self.__instrumentation_timer.setInterval(int(1000 * instrumentation_interval))
+            self.__instrumentation_timer.timeout.connect(self.__show_instrumentation)
         self.__ui = uic.loadUi(_UI_LAYOUT_PATH)
         self.__ui.show()
         self.__init_window()
@@ -36,8 +79,11 @@ class LegMonitorPanel(QtGui.QMainWindow):
             'bottom fluid pressure': ('fluid pressure', 1)
         }
 
+        # Actors update widgets through the render bridge, in the Qt main thread
+        self.__render_bridge = gui.RenderBridge()
+
         self.__init_graphs()
-        self.__init_curve_updaters(graph_width)
+        self.__init_curve_updaters(graph_width, frame_rate, graph_duration, history)
 
         self.__init_labels()
         self.__init_label_updaters()
@@ -47,6 +93,9 @@ class LegMonitorPanel(QtGui.QMainWindow):
 
         self.__monitor = None
 
+    def __start_actor(self, actor_class, *args):
+        return actors.start(actor_class, *args, runtime=self.__actor_runtime)
+
     def __init_window(self):
         # Actions
         self.__ui.actionExit.triggered.connect(QtGui.QApplication.instance().quit)
@@ -90,7 +139,7 @@ class LegMonitorPanel(QtGui.QMainWindow):
             'bottom fluid pressure': self.__ui.bottomFluidMin
         }
 
-    def __init_curve_updaters(self, graph_width):
+    def __init_curve_updaters(self, graph_width, frame_rate, graph_duration, history):
         self.__curve_types = {
             'raw': {
                 'pen': 'r',
@@ -115,13 +164,48 @@ class LegMonitorPanel(QtGui.QMainWindow):
             'max': {},
             'min': {}
         }
+        self.__curve_inputs = { # actors which should be sent the samples for each curve
+            'raw': {},
+            'denoised': {},
+            'max': {},
+            'min': {}
+        }
         for name in self._display_components:
             for (curve_type, curve_props) in self.__curve_types.items():
                 curve = self.__graphs[name].plot(pen=curve_props['pen'], name=curve_props['name'])
-                curve_updater = plotting.CurveUpdater.start(curve, graph_width)
+                if graph_duration is None:
+                    curve_updater = self.__start_actor(plotting.CurveUpdater, curve, graph_width,
+                                                       True, self.__render_bridge, history)
+                    curve_input = curve_updater
+                else:
+                    # Each pixel column shows the min and max samples of its span of time
+                    curve_updater = self.__start_actor(plotting.CurveUpdater, curve,
+                                                       2 * graph_width, True,
+                                                       self.__render_bridge, history)
+                    curve_input = self.__start_actor(signal.Decimator, graph_duration / graph_width)
+                    channel = name if curve_type == 'denoised' else (name, curve_type)
+                    curve_input.proxy().register(curve_updater, channel)
                 if curve_type != 'denoised':
                     curve_updater.tell({'command': 'hide'})
                 self.__curve_updaters[curve_type][name] = curve_updater
+                self.__curve_inputs[curve_type][name] = curve_input
+        # Curves are redrawn at the frame rate, regardless of the sample rate
+        self.__frame_clock = self.__start_actor(plotting.FrameClock, frame_rate)
+        for curve_updaters in self.__curve_updaters.values():
+            for curve_updater in curve_updaters.values():
+                self.__frame_clock.proxy().register(curve_updater, 'render')
+        self.__frame_clock.tell({'command': 'start producing'})
+        if history:
+            for (name, graph) in self.__graphs.items():
+                graph.getViewBox().sigXRangeChanged.connect(partial(self.__set_view, name))
+
+    def __set_view(self, name, view_box, x_range):
+        """Draws the stored history of the curves over the visible range of a graph."""
+        following = view_box.autoRangeEnabled()[0] # not following if the user panned or zoomed
+        message = {'command': 'view', 'range': None if following else tuple(x_range),
+                   'pixels': int(view_box.width())}
+        for curve_updaters in self.__curve_updaters.values():
+            curve_updaters[name].tell(message)
 
     def __init_label_updaters(self):
         self.__label_updaters = {
@@ -130,46 +214,64 @@ class LegMonitorPanel(QtGui.QMainWindow):
             'min': {}
         }
         for name in self._display_components:
-            denoised_label_updater = gui.LabelUpdater.start(self.__denoised_labels[name],
-                                                            "Value")
+            denoised_label_updater = self.__start_actor(gui.LabelUpdater,
+                                                        self.__denoised_labels[name], "Value",
+                                                        self.__render_bridge,
+                                                        LABEL_DISPLAY_INTERVAL)
             self.__label_updaters['denoised'][name] = denoised_label_updater
-            max_label_updater = gui.LabelUpdater.start(self.__max_labels[name], "Max")
+            max_label_updater = self.__start_actor(gui.LabelUpdater, self.__max_labels[name],
+                                                   "Max", self.__render_bridge,
+                                                   LABEL_DISPLAY_INTERVAL, 'max')
             self.__label_updaters['max'][name] = max_label_updater
-            min_label_updater = gui.LabelUpdater.start(self.__min_labels[name], "Min")
+            min_label_updater = self.__start_actor(gui.LabelUpdater, self.__min_labels[name],
+                                                   "Min", self.__render_bridge,
+                                                   LABEL_DISPLAY_INTERVAL, 'min')
             self.__label_updaters['min'][name] = min_label_updater
+        # Labels show the samples received since their last update even after samples stop
+        for label_updaters in self.__label_updaters.values():
+            for label_updater in label_updaters.values():
+                self.__frame_clock.proxy().register(label_updater, 'render')
 
     def __init_filters(self, filter_width, graph_width):
         self.__filterers = {
+            'raw': {},
             'denoised': {},
             'max': {},
             'min': {}
         }
-        self.__maximizers = {}
-        self.__minimizers = {}
-        for name in self._display_components:
-            filterer = signal.Filterer.start(filter_width)
-            self.__filterers['denoised'][name] = filterer
-            maximizer = signal.Filterer.start(graph_width // 4, max, "right")
-            self.__filterers['max'][name] = maximizer
-            filterer.proxy().register(maximizer, name)
-            minimizer = signal.Filterer.start(graph_width // 4, min, "right")
-            self.__filterers['min'][name] = minimizer
-            filterer.proxy().register(minimizer, name)
+        self.__filter_channels = {
+            'raw': {},
+            'denoised': {},
+            'max': {},
+            'min': {}
+        }
+        self.__multi_filterers = {}
+        for sensor in self._sensors:
+            # All components of a sensor are filtered at once, in a single actor
+            positions = {position: name for (name, (component_sensor, position))
+                         in self._display_components.items() if component_sensor == sensor}
+            channels = [positions.get(position) for position in range(max(positions) + 1)]
+            multi_filterer = self.__start_actor(signal.MultiFilterer, channels, filter_width,
+                                                np.median, "centered", graph_width // 4)
+            self.__multi_filterers[sensor] = multi_filterer
+            for name in positions.values():
+                for filter_type in self.__filterers:
+                    self.__filterers[filter_type][name] = multi_filterer
+                self.__filter_channels['raw'][name] = (name, 'raw')
+                self.__filter_channels['denoised'][name] = name
+                self.__filter_channels['min'][name] = (name, 'min')
+                self.__filter_channels['max'][name] = (name, 'max')
 
     def __init_unit_conversion(self):
-        self.__unit_converter = leg.LegUnitConverter.start()
-        self.__tuple_selectors = {}
-        for (name, properties) in self._display_components.items():
-            tuple_selector = signal.TupleSelector.start(properties[1], name)
-            self.__unit_converter.proxy().register(tuple_selector, properties[0])
-            tuple_selector.proxy().register(self.__filterers['denoised'][name],
-                                            name)
-            self.__tuple_selectors[name] = tuple_selector
+        self.__unit_converter = self.__start_actor(leg.LegUnitConverter)
+        for (sensor, multi_filterer) in self.__multi_filterers.items():
+            self.__unit_converter.proxy().register(multi_filterer, sensor)
 
     def __init_monitoring(self):
         self.__ui.statusbar.showMessage("Connecting...")
         try:
-            monitor = leg.LegMonitor.start()
+            monitor = self.__start_actor(leg.LegMonitor)
+            monitor.proxy().set_batching(SAMPLE_BATCH_MAX_SIZE, SAMPLE_BATCH_MAX_LATENCY)
             self.__monitor = monitor
         except RuntimeError as e:
             self.__ui.statusbar.showMessage(str(e))
@@ -185,32 +287,51 @@ class LegMonitorPanel(QtGui.QMainWindow):
         self.__ui.actionStartMonitoring.trigger()
 
     def __start_monitoring(self):
+        for multi_filterer in self.__multi_filterers.values():
+            multi_filterer.tell({'command': 'clear'})
         for name in self._display_components:
-            raw_curve_updater = self.__curve_updaters['raw'][name]
-            raw_curve_updater.tell({'command': 'clear'})
-            self.__tuple_selectors[name].proxy().register(raw_curve_updater, name)
             for filter_type in self.__filterers.keys():
                 filterer = self.__filterers[filter_type][name]
-                filterer.tell({'command': 'clear'})
-                curve_updater = self.__curve_updaters[filter_type][name]
-                curve_updater.tell({'command': 'clear'})
-                filterer.proxy().register(curve_updater, name)
-                filterer.proxy().register(self.__label_updaters[filter_type][name], name)
+                channel = self.__filter_channels[filter_type][name]
+                self.__clear_curve(filter_type, name)
+                filterer.proxy().register(self.__curve_inputs[filter_type][name], channel,
+                                          CURVE_MAILBOX_LIMIT, 'drop oldest')
+                if filter_type == 'denoised':
+                    filterer.proxy().register(self.__label_updaters[filter_type][name], channel,
+                                              LABEL_MAILBOX_LIMIT, 'keep latest')
+                elif filter_type in self.__label_updaters:
+                    filterer.proxy().register(self.__label_updaters[filter_type][name], channel)
         self.__monitor.tell({'command': 'start producing', 'interval': self.update_interval})
+        if self.__instrumentation_timer is not None:
+            instrumentation.reset()
+            self.__instrumentation_timer.start()
         self.__ui.actionStartMonitoring.setDisabled(True)
         self.__ui.actionStopMonitoring.setDisabled(False)
 
     def __stop_monitoring(self):
         self.__monitor.tell({'command': 'stop producing'})
+        if self.__instrumentation_timer is not None:
+            self.__instrumentation_timer.stop()
         self.__ui.actionStartMonitoring.setDisabled(False)
         self.__ui.actionStopMonitoring.setDisabled(True)
         for name in self._display_components:
-            raw_curve_updater = self.__curve_updaters['raw'][name]
-            self.__tuple_selectors[name].proxy().deregister(raw_curve_updater, name)
             for filter_type in self.__filterers.keys():
                 filterer = self.__filterers[filter_type][name]
-                filterer.proxy().deregister(self.__curve_updaters[filter_type][name], name)
-                filterer.proxy().deregister(self.__label_updaters[filter_type][name], name)
+                channel = self.__filter_channels[filter_type][name]
+                filterer.proxy().deregister(self.__curve_inputs[filter_type][name], channel)
+                if filter_type in self.__label_updaters:
+                    filterer.proxy().deregister(self.__label_updaters[filter_type][name],
+                                                channel)
+
+    def __show_instrumentation(self):
+        self.__ui.statusbar.showMessage(instrumentation.format_summary())
+
+    def __clear_curve(self, curve_type, name):
+        curve_updater = self.__curve_updaters[curve_type][name]
+        curve_updater.tell({'command': 'clear'})
+        curve_input = self.__curve_inputs[curve_type][name]
+        if curve_input is not curve_updater:
+            curve_input.tell({'command': 'clear'})
 
     def __toggle_additional_plots(self, show_additional):
         for curve_type in self.__curve_types:
@@ -240,8 +361,13 @@ class LegMonitorPanel(QtGui.QMainWindow):
 if __name__ == "__main__":
     pg.setConfigOptions(antialias=True, background='w', foreground='k')
     app = QtGui.QApplication(sys.argv)
-    leg_monitor_panel = LegMonitorPanel(0.05, 20, 800)
+    actor_runtime = (actors.PooledRuntime(ACTOR_RUNTIME_WORKERS)
+                     if ACTOR_RUNTIME_WORKERS is not None else None)
+    leg_monitor_panel = LegMonitorPanel(0.05, 20, 800, actor_runtime=actor_runtime,
+                                        instrumentation_interval=INSTRUMENTATION_INTERVAL)
     app.aboutToQuit.connect(QtGui.QApplication.instance().quit)
     app.exec_()
+    if actor_runtime is not None:
+        actor_runtime.stop_all() # stop actors in LIFO order
     pykka.ActorRegistry.stop_all() # stop actors in LIFO order
     sys.exit()
@@ -0,0 +1,84 @@
+"""Compact message types for data samples of signals."""
+# Dependency imports
+import numpy as np
+
+_ENTRIES = ('type', 'time', 'data')
+
+class Sample(object):
+    """A data message holding a single sample of a signal.
+    Stores its type, time, and data entries in slots rather than in a dict, so that it is smaller
+    and faster to create and copy than the equivalent dict message. It supports the parts of the
+    dict interface used by actors and by pykka to handle messages, so actors handle Sample messages
+    and dict messages interchangeably: for example, message['data'] gets the data entry, and
+    'command' in message is False.
+
+    Arguments:
+        type: the type of the data sample, which is usually also the channel it is broadcast on.
+        time: the time of the data sample.
+        data: the value of the data sample.
+    """
+    __slots__ = _ENTRIES
+    def __init__(self, type, time, data):
+        self.type = type
+        self.time = time
+        self.data = data
+
+    def __repr__(self):
+        return "{}(type={!r}, time={!r}, data={!r})".format(self.__class__.__name__, self.type,
+                                                            self.time, self.data)
+
+    def __eq__(self, other):
+        if isinstance(other, Sample):
+            return (self.type, self.time, self.data) == (other.type, other.time, other.data)
+        return NotImplemented
+    __hash__ = None
+
+    def __getitem__(self, key):
+        if key not in _ENTRIES:
+            raise KeyError(key)
+        return getattr(self, key)
+    def __setitem__(self, key, value):
+        if key not in _ENTRIES:
+            raise KeyError(key)
+        setattr(self, key, value)
+    def __contains__(self, key):
+        return key in _ENTRIES
+
+    def get(self, key, default=None):
+        """Returns the specified entry, or default if the message has no such entry."""
+        return getattr(self, key) if key in _ENTRIES else default
+    def pop(self, key, *default):
+        """Only supports keys which the message doesn't have, like the pykka_reply_to key which
+        pykka pops from every message, and then returns the default.
+        """
+        if key in _ENTRIES:
+            raise TypeError("Cannot remove the {} entry of a {}"
+                            .format(key, self.__class__.__name__))
+        if default:
+            return default[0]
+        raise KeyError(key)
+    def keys(self):
+        """Returns the names of the entries of the message."""
+        return _ENTRIES
+    def copy(self):
+        """Returns a shallow copy of the message."""
+        return self.__class__(self.type, self.time, self.data)
+
+class SampleBatch(Sample):
+    """A data message holding a batch of consecutive samples of a signal.
+    The time and data entries are NumPy arrays of the times and values of the samples, with one
+    row per sample.
+    """
+    __slots__ = ()
+    def __init__(self, type, time, data):
+        super().__init__(type, np.asarray(time), np.asarray(data))
+
+    def __len__(self):
+        return len(self.time)
+
+    def __eq__(self, other):
+        if isinstance(other, Sample):
+            return (self.type == other.type and np.array_equal(self.time, other.time)
+                    and np.array_equal(self.data, other.data))
+        return NotImplemented
+    __hash__ = None
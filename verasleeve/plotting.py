@@ -1,11 +1,28 @@
 """Controls the Arduino board of the leg model test fixture."""
-# Python imports
-from collections import deque
-
 # Dependency imports
+import numpy as np
 import pykka
 
-class CurveUpdater(pykka.ThreadingActor):
+# Package imports
+from verasleeve import actors, buffers, instrumentation
+
+_RENDER_COMMAND = {'command': 'render'}
+
+class FrameClock(actors.Broadcaster, actors.Producer):
+    """Periodically tells registered actors to render, at a fixed frame rate.
+
+    Public Messages:
+        Command (broadcasted):
+            render: broadcasted on the 'render' channel once per frame.
+    """
+    def __init__(self, frame_rate=30):
+        super().__init__()
+        self.interval = 1 / frame_rate
+
+    def _on_produce(self):
+        self.broadcast(_RENDER_COMMAND, 'render')
+
+class CurveUpdater(actors.BoundedMailbox, pykka.ThreadingActor):
     """Updates a PyQtGraph curve with samples.
 
     Public Messages:
@@ -14,20 +31,50 @@ class CurveUpdater(pykka.ThreadingActor):
             corresponding to the x axis value.
             The data entry should specify the value of the data sample, corresponding to the
             y axis value.
+            A batch of samples can be sent in a single data message whose time and data entries
+            are NumPy arrays of the times and values of consecutive samples.
         Command (received):
             clear: clears the curve.
             show: starts plotting the curve.
             hide: clears and hides the curve.
+            render: redraws the curve if samples were received since it was last drawn. Only
+            needed if the CurveUpdater is frame-coalesced; register the CurveUpdater for the
+            'render' channel of a FrameClock to redraw the curve at the FrameClock's frame rate.
+            view: sets the range of the curve to draw. Only has an effect if the CurveUpdater
+            stores the curve's history.
+                range: a 2-tuple of the start and end times to draw, or None to draw the
+                max_samples most recent samples (or the entire history, if max_samples is None).
+                pixels: optional attribute. If provided, sets the number of pixels across which
+                the curve is drawn, which bounds the number of points drawn.
+
+    Arguments:
+        frame_coalesced: if True, data messages only add samples to the curve's buffers, and the
+        curve is only redrawn upon a render command. Otherwise, the curve is redrawn upon every
+        data message.
+        render_bridge: if not None, a gui.RenderBridge through which the curve is redrawn in the
+        Qt main thread. Otherwise, the curve is redrawn directly from the actor's thread.
+        history: if True, the entire history of the curve is stored in a buffers.SummaryPyramid
+        instead of only storing the max_samples most recent samples, so that any range of the
+        history can be drawn with a number of points bounded by the curve's pixel width.
     """
-    def __init__(self, curve, max_samples=None):
+    def __init__(self, curve, max_samples=None, frame_coalesced=False, render_bridge=None,
+                 history=False):
         super().__init__()
         self.curve = curve
         self.max_samples = max_samples
-        self.curve_x = None
-        self.curve_y = None
+        self.frame_coalesced = frame_coalesced
+        self.render_bridge = render_bridge
+        self.curve_x = buffers.RingBuffer(max_samples)
+        self.curve_y = buffers.RingBuffer(max_samples)
+        self.history = buffers.SummaryPyramid() if history else None
+        self.__view_range = None
+        self.__view_pixels = 1000
         self.__plotting = True
+        self.__stale = False # whether samples were received since the curve was last drawn
+        self.__latest_sample_time = None
         self.__clear_curve()
 
+    @instrumentation.instrumented
     def on_receive(self, message):
         """Slot that updates the curves with the next sample."""
         if 'command' in message:
@@ -41,23 +88,72 @@ class CurveUpdater(pykka.ThreadingActor):
             self.__clear_curve()
         elif message['command'] == 'show':
             self.__plotting = True
-            self.curve.setData(self.curve_x, self.curve_y)
+            self.__update_curve()
         elif message['command'] == 'hide':
             self.__plotting = False
             self.__clear_curve()
+        elif message['command'] == 'render':
+            if self.__plotting and self.__stale:
+                self.__update_curve()
+        elif message['command'] == 'view':
+            self.__view_range = message['range']
+            self.__view_pixels = message.get('pixels', self.__view_pixels)
+            if self.__plotting and self.history is not None:
+                self.__update_curve()
 
     def __on_data(self, message):
         """Processes data messages."""
         sample_time = message['time']
         sample = message['data']
-        self.curve_x.append(sample_time)
-        self.curve_y.append(sample)
-        if self.__plotting:
-            self.curve.setData(self.curve_x, self.curve_y)
+        if self.history is not None:
+            if isinstance(sample_time, np.ndarray):
+                self.history.extend(sample_time, sample)
+            else:
+                self.history.append(sample_time, sample)
+        elif isinstance(sample_time, np.ndarray):
+            self.curve_x.extend(sample_time)
+            self.curve_y.extend(sample)
+        else:
+            self.curve_x.append(sample_time)
+            self.curve_y.append(sample)
+        self.__latest_sample_time = (sample_time[-1] if isinstance(sample_time, np.ndarray)
+                                     else sample_time)
+        if self.__plotting and not self.frame_coalesced:
+            self.__update_curve()
+        else:
+            self.__stale = True
 
     def __clear_curve(self):
         """Clears the curve."""
-        self.curve_x = deque(maxlen=self.max_samples)
-        self.curve_y = deque(maxlen=self.max_samples)
-        self.curve.setData(self.curve_x, self.curve_y)
+        self.curve_x.clear()
+        self.curve_y.clear()
+        if self.history is not None:
+            self.history.clear()
+        self.__update_curve()
+    def __update_curve(self):
+        """Draws the buffered samples on the curve."""
+        # PyQtGraph keeps references to the arrays it is given, so it must be given copies
+        if self.history is not None:
+            (curve_x, curve_y) = self.__get_history_view()
+        else:
+            (curve_x, curve_y) = (self.curve_x.snapshot(), self.curve_y.snapshot())
+        if self.render_bridge is None:
+            self.curve.setData(curve_x, curve_y)
+            if self.__latest_sample_time is not None: # samples were added since the last drawing
+                instrumentation.record_latency(self, self.__latest_sample_time)
+        else:
+            # The latency is recorded once the Qt main thread has applied the update
+            self.render_bridge.post(self.curve, 'setData', curve_x, curve_y,
+                                    actor=self, sample_time=self.__latest_sample_time)
+        self.__latest_sample_time = None
+        self.__stale = False
+    def __get_history_view(self):
+        """Returns the points to draw for the view range of the curve's history."""
+        if self.__view_range is not None:
+            (start_time, end_time) = self.__view_range
+        elif self.max_samples is not None and len(self.history) > self.max_samples:
+            (start_time, end_time) = (self.history.sample_time(-self.max_samples), None)
+        else:
+            (start_time, end_time) = (None, None)
+        return self.history.envelope(start_time, end_time, 2 * self.__view_pixels)
 
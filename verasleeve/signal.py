@@ -1,22 +1,471 @@
 """Support for signal processing."""
 # Python imports
-from collections import deque
+from collections import deque, Counter
+from heapq import heappush, heappop
+from functools import partial
+import math
+import operator
 
 # Dependency imports
 import numpy as np
+from numpy.lib.stride_tricks import sliding_window_view
 import pykka
 
 # Package imports
-from verasleeve import actors, coroutines
+from verasleeve import actors, buffers, calibration, coroutines, instrumentation, messages
 
 def get_interpolator(x_y, left_limit, right_limit):
-    """Returns an interpolating function given a tuple of 2-tuples of x and y values."""
-    (x_series, y_series) = zip(*x_y)
-    return lambda interpolated_x: np.interp([interpolated_x], x_series, y_series,
-                                            left_limit, right_limit)[0]
+    """Returns an interpolating function given a tuple of 2-tuples of x and y values.
+    The function interpolates single values or arrays of values; see
+    calibration.PiecewiseCalibration.
+    """
+    return calibration.PiecewiseCalibration(x_y, left_limit, right_limit)
+
+class WindowFilter(object):
+    """Filters a sliding window of the most recent samples of a signal.
+    The base class stores the window and re-evaluates an arbitrary filtering function over the
+    entire window whenever the result is requested. Subclasses implement streaming filters which
+    update their result incrementally as samples enter and leave the window.
+
+    Arguments:
+        max_samples: the window size. If this is None, the window holds all samples.
+        filterer: a function which computes the filtered result from an iterable of samples.
+        num_channels: if not None, each sample is an array of the values of this many channels
+        of a signal, and all channels are filtered at once. filterer is then called with an
+        axis=0 argument on a 2-D array of the window, with one row per sample, and must return
+        the results for all channels, like np.median does.
+    """
+    def __init__(self, max_samples=None, filterer=np.median, num_channels=None):
+        super().__init__()
+        self.max_samples = max_samples
+        self.filterer = filterer
+        self.num_channels = num_channels
+        self._window = buffers.RingBuffer(max_samples, sample_shape=(
+            (num_channels,) if num_channels is not None else ()))
+
+    def __len__(self):
+        return len(self._window)
+
+    def append(self, value):
+        """Adds a sample to the window, evicting the oldest sample if the window is full."""
+        self._window.append(value)
+    def result(self):
+        """Returns the filtered result of the samples currently in the window."""
+        if self.num_channels is not None:
+            return self.filterer(self._window.view(), axis=0)
+        return self.filterer(self._window)
+    def clear(self):
+        """Removes all samples from the window."""
+        self._window.clear()
+    def extend(self, values):
+        """Adds a block of samples to the window.
+        Returns an array of the filtered results for each sample, as result would have returned
+        immediately after that sample was appended. If the filter can be evaluated with NumPy over
+        all windows at once, the results are computed on a sliding-window view of the samples.
+        """
+        values = np.asarray(values, dtype=float)
+        vectorized_filterer = self._get_vectorized_filterer()
+        if self.max_samples is None or vectorized_filterer is None:
+            results = []
+            for value in values:
+                self.append(value)
+                results.append(self.result())
+            return np.array(results)
+        num_previous = len(self._window)
+        history = np.concatenate((self._window.view(), values))
+        # Samples which arrive before the window is full are filtered over partial windows
+        num_partial = min(max(0, self.max_samples - 1 - num_previous), len(values))
+        # Samples are along the first axis of the history, but filtered along the last axis
+        partial_results = [vectorized_filterer(np.moveaxis(history[:num_previous + i + 1], 0, -1))
+                           for i in range(num_partial)]
+        if num_partial == len(values):
+            results = np.array(partial_results)
+        else:
+            windows = sliding_window_view(history, self.max_samples, axis=0)
+            first_window = num_previous + num_partial + 1 - self.max_samples
+            results = vectorized_filterer(windows[first_window:])
+            if partial_results:
+                results = np.concatenate((partial_results, results))
+        self._reload(history[-self.max_samples:])
+        return results
+
+    def _get_vectorized_filterer(self):
+        """Returns a function which computes the filtered result over the last axis of an array
+        of windows, or None if the filter can only be evaluated one window at a time.
+        """
+        try:
+            vectorized_filterer = VECTORIZED_FILTERERS.get(self.filterer)
+        except TypeError: # unhashable filterer
+            return None
+        if vectorized_filterer is None:
+            return None
+        return partial(vectorized_filterer, axis=-1)
+    def _reload(self, values):
+        """Replaces the samples in the window with the specified samples."""
+        self.clear()
+        for value in values:
+            self.append(value)
+
+class MedianFilter(WindowFilter):
+    """Computes the median of a sliding window in O(log max_samples) time per sample.
+    The lower half of the window is kept in a max-heap and the upper half in a min-heap. Samples
+    evicted from the window are deleted lazily, once they reach the top of their heap.
+    """
+    def __init__(self, max_samples=None):
+        super().__init__(max_samples, np.median)
+        self.__low = [] # max-heap of the lower half, stored as negated values
+        self.__high = [] # min-heap of the upper half
+        self.__low_size = 0 # number of samples in the lower half not pending deletion
+        self.__high_size = 0 # number of samples in the upper half not pending deletion
+        self.__pending_deletions = Counter()
+
+    def __len__(self):
+        return self.__low_size + self.__high_size
+
+    def append(self, value):
+        if self.max_samples is not None:
+            if len(self._window) == self.max_samples:
+                self.__remove(self._window[0])
+            self._window.append(value)
+        if not self.__low or value <= -self.__low[0]:
+            heappush(self.__low, -value)
+            self.__low_size += 1
+        else:
+            heappush(self.__high, value)
+            self.__high_size += 1
+        self.__rebalance()
+    def result(self):
+        if not self.__low_size:
+            return float('nan')
+        if self.__low_size > self.__high_size:
+            return -self.__low[0]
+        return (-self.__low[0] + self.__high[0]) / 2
+    def clear(self):
+        super().clear()
+        self.__low = []
+        self.__high = []
+        self.__low_size = 0
+        self.__high_size = 0
+        self.__pending_deletions = Counter()
+
+    def __remove(self, value):
+        """Lazily deletes a sample from whichever half of the window holds it."""
+        self.__pending_deletions[value] += 1
+        if value <= -self.__low[0]:
+            self.__low_size -= 1
+            if value == -self.__low[0]:
+                self.__prune(self.__low, -1)
+        else:
+            self.__high_size -= 1
+            if value == self.__high[0]:
+                self.__prune(self.__high, 1)
+        self.__rebalance()
+    def __rebalance(self):
+        """Moves a sample between the heaps so that the lower half holds the extra sample."""
+        if self.__low_size > self.__high_size + 1:
+            heappush(self.__high, -heappop(self.__low))
+            self.__low_size -= 1
+            self.__high_size += 1
+            self.__prune(self.__low, -1)
+        elif self.__low_size < self.__high_size:
+            heappush(self.__low, -heappop(self.__high))
+            self.__high_size -= 1
+            self.__low_size += 1
+            self.__prune(self.__high, 1)
+    def __prune(self, heap, sign):
+        """Pops samples pending deletion from the top of a heap."""
+        pending_deletions = self.__pending_deletions
+        while heap:
+            value = sign * heap[0]
+            if not pending_deletions.get(value):
+                return
+            pending_deletions[value] -= 1
+            if not pending_deletions[value]:
+                del pending_deletions[value]
+            heappop(heap)
+
+class MaxFilter(WindowFilter):
+    """Computes the maximum of a sliding window in amortized O(1) time per sample.
+    Keeps a deque of the samples which can still become the maximum of the window, in decreasing
+    order, along with their positions in the signal so that they can be evicted from the window.
+    """
+    def __init__(self, max_samples=None):
+        super().__init__(max_samples, max)
+        self._dominates = operator.ge
+        self.__candidates = deque()
+        self.__num_samples = 0 # number of samples appended since the window was cleared
+
+    def __len__(self):
+        if self.max_samples is None:
+            return self.__num_samples
+        return min(self.__num_samples, self.max_samples)
+
+    def append(self, value):
+        candidates = self.__candidates
+        dominates = self._dominates
+        while candidates and dominates(value, candidates[-1][1]):
+            candidates.pop()
+        candidates.append((self.__num_samples, value))
+        self.__num_samples += 1
+        if (self.max_samples is not None
+                and candidates[0][0] < self.__num_samples - self.max_samples):
+            candidates.popleft()
+    def result(self):
+        return self.__candidates[0][1]
+    def clear(self):
+        self.__candidates.clear()
+        self.__num_samples = 0
+
+    def _get_vectorized_filterer(self):
+        return None # the window itself is not stored
+
+class MinFilter(MaxFilter):
+    """Computes the minimum of a sliding window in amortized O(1) time per sample."""
+    def __init__(self, max_samples=None):
+        super().__init__(max_samples)
+        self.filterer = min
+        self._dominates = operator.le
+
+class ExtremaFilter(WindowFilter):
+    """Computes both the minimum and the maximum of a sliding window in a single pass.
+    The filtered result is a 2-tuple of the minimum and maximum, respectively.
+    """
+    def __init__(self, max_samples=None):
+        super().__init__(max_samples, lambda window: (min(window), max(window)))
+        self.__min_filter = MinFilter(max_samples)
+        self.__max_filter = MaxFilter(max_samples)
+
+    def __len__(self):
+        return len(self.__max_filter)
+
+    def append(self, value):
+        self.__min_filter.append(value)
+        self.__max_filter.append(value)
+    def result(self):
+        return (self.__min_filter.result(), self.__max_filter.result())
+    def clear(self):
+        self.__min_filter.clear()
+        self.__max_filter.clear()
+
+    def _get_vectorized_filterer(self):
+        return None # the window itself is not stored
+
+class MeanFilter(WindowFilter):
+    """Computes the mean of a sliding window in O(1) time per sample.
+    Bounded windows keep a running sum of the window, which is periodically recomputed with exact
+    (compensated) summation so that rounding errors cannot accumulate. Unbounded windows use
+    Welford's cumulative update and do not store any samples.
+
+    Arguments:
+        resummation_interval: the number of samples evicted from a bounded window between exact
+        recomputations of the running sum. Defaults to max_samples.
+    """
+    def __init__(self, max_samples=None, resummation_interval=None):
+        super().__init__(max_samples, np.mean)
+        self.resummation_interval = (resummation_interval if resummation_interval is not None
+                                     else max_samples)
+        self.__num_samples = 0
+        self.__sum = 0.0 # running sum of a bounded window
+        self.__mean = 0.0 # cumulative mean of an unbounded window
+        self.__evictions = 0 # number of samples evicted since the last exact recomputation
+
+    def __len__(self):
+        return self.__num_samples
+
+    def append(self, value):
+        if self.max_samples is None:
+            self.__num_samples += 1
+            self.__mean += (value - self.__mean) / self.__num_samples
+            return
+        window = self._window
+        if len(window) == self.max_samples:
+            self.__sum -= window[0]
+            self.__evictions += 1
+        window.append(value)
+        self.__sum += value
+        self.__num_samples = len(window)
+        if self.__evictions >= self.resummation_interval:
+            self.__sum = math.fsum(window)
+            self.__evictions = 0
+    def result(self):
+        if not self.__num_samples:
+            return float('nan')
+        if self.max_samples is None:
+            return self.__mean
+        return self.__sum / self.__num_samples
+    def clear(self):
+        super().clear()
+        self.__num_samples = 0
+        self.__sum = 0.0
+        self.__mean = 0.0
+        self.__evictions = 0
+
+class VarianceFilter(WindowFilter):
+    """Computes the variance of a sliding window in O(1) time per sample.
+    The mean and the sum of squared deviations from the mean are maintained with Welford's update
+    as samples enter the window and with its inverse as samples leave a bounded window. Bounded
+    windows are periodically recomputed with exact (compensated) summation so that rounding
+    errors cannot accumulate. Unbounded windows do not store any samples.
+
+    Arguments:
+        ddof: delta degrees of freedom, as for np.var.
+        resummation_interval: the number of samples evicted from a bounded window between exact
+        recomputations of the running statistics. Defaults to max_samples.
+    """
+    def __init__(self, max_samples=None, ddof=0, resummation_interval=None):
+        super().__init__(max_samples, np.var)
+        self.ddof = ddof
+        self.resummation_interval = (resummation_interval if resummation_interval is not None
+                                     else max_samples)
+        self.__num_samples = 0
+        self.__mean = 0.0
+        self.__squared_deviations = 0.0
+        self.__evictions = 0 # number of samples evicted since the last exact recomputation
+
+    def __len__(self):
+        return self.__num_samples
+
+    def append(self, value):
+        if self.max_samples is not None:
+            window = self._window
+            if len(window) == self.max_samples:
+                self.__remove(window[0])
+                self.__evictions += 1
+            window.append(value)
+        self.__num_samples += 1
+        delta = value - self.__mean
+        self.__mean += delta / self.__num_samples
+        self.__squared_deviations += delta * (value - self.__mean)
+        if self.max_samples is not None and self.__evictions >= self.resummation_interval:
+            self.__resum()
+    def result(self):
+        if self.__num_samples <= self.ddof:
+            return float('nan')
+        return max(self.__squared_deviations, 0.0) / (self.__num_samples - self.ddof)
+    def clear(self):
+        super().clear()
+        self.__num_samples = 0
+        self.__mean = 0.0
+        self.__squared_deviations = 0.0
+        self.__evictions = 0
+
+    def _get_vectorized_filterer(self):
+        return partial(self.filterer, axis=-1, ddof=self.ddof)
+
+    def __remove(self, value):
+        """Removes the contribution of an evicted sample from the running statistics."""
+        self.__num_samples -= 1
+        if not self.__num_samples:
+            self.__mean = 0.0
+            self.__squared_deviations = 0.0
+            return
+        delta = value - self.__mean
+        self.__mean -= delta / self.__num_samples
+        self.__squared_deviations -= delta * (value - self.__mean)
+    def __resum(self):
+        """Recomputes the running statistics exactly from the samples in the window."""
+        window = self._window
+        self.__mean = math.fsum(window) / len(window)
+        self.__squared_deviations = math.fsum((value - self.__mean) ** 2 for value in window)
+        self.__evictions = 0
+
+class StdFilter(VarianceFilter):
+    """Computes the standard deviation of a sliding window in O(1) time per sample."""
+    def __init__(self, max_samples=None, ddof=0, resummation_interval=None):
+        super().__init__(max_samples, ddof, resummation_interval)
+        self.filterer = np.std
+
+    def result(self):
+        return math.sqrt(super().result())
+
+class ChannelFilter(WindowFilter):
+    """Filters each channel of a multi-channel signal with its own streaming filter.
+    Each appended sample is added to the streaming filter of each channel, so that single samples
+    are filtered incrementally. The samples are also kept in a 2-D window, so that blocks of
+    samples are filtered for all channels at once with the vectorized filterer over a
+    sliding-window view of the window; see WindowFilter.extend.
+
+    Arguments:
+        channel_filter: the WindowFilter subclass which filters each channel.
+    """
+    def __init__(self, max_samples, filterer, num_channels, channel_filter):
+        super().__init__(max_samples, filterer, num_channels)
+        self.__channel_filters = [channel_filter(max_samples) for _ in range(num_channels)]
+
+    def append(self, value):
+        super().append(value)
+        if isinstance(value, np.ndarray): # Python floats are faster to compare and add
+            value = value.tolist()
+        for (channel_filter, channel_value) in zip(self.__channel_filters, value):
+            channel_filter.append(channel_value)
+    def result(self):
+        return np.array([channel_filter.result() for channel_filter in self.__channel_filters])
+    def clear(self):
+        super().clear()
+        for channel_filter in self.__channel_filters:
+            channel_filter.clear()
+
+# Streaming implementations of common filtering functions, used by get_window_filter
+STREAMING_FILTERS = {
+    np.median: MedianFilter,
+    max: MaxFilter,
+    np.max: MaxFilter,
+    np.amax: MaxFilter,
+    min: MinFilter,
+    np.min: MinFilter,
+    np.amin: MinFilter,
+    np.mean: MeanFilter,
+    np.var: VarianceFilter,
+    np.std: StdFilter
+}
+
+def extrema(values, axis=-1):
+    """Returns the minimum and maximum of an array along an axis, stacked along a new last axis.
+    This is the vectorized counterpart of ExtremaFilter, for filtering multiple channels at once.
+    """
+    return np.stack((np.min(values, axis=axis), np.max(values, axis=axis)), axis=-1)
+
+STREAMING_FILTERS[extrema] = ExtremaFilter
+
+# NumPy functions which can filter many windows at once along an axis, used by WindowFilter.extend
+VECTORIZED_FILTERERS = {
+    np.median: np.median,
+    np.mean: np.mean,
+    np.var: np.var,
+    np.std: np.std,
+    np.max: np.max,
+    np.amax: np.amax,
+    np.min: np.min,
+    np.amin: np.amin,
+    extrema: extrema
+}
+
+def get_window_filter(filterer=np.median, max_samples=None, num_channels=None):
+    """Returns a WindowFilter which applies filterer over a window of max_samples samples.
+    If filterer is a subclass of WindowFilter, it is instantiated directly. If filterer is a
+    function with a streaming implementation in STREAMING_FILTERS, that implementation is used.
+    Otherwise, filterer is re-evaluated over the entire window whenever a filtered result is
+    needed.
+    If num_channels is not None, each sample holds the values of num_channels channels. If
+    filterer has a streaming implementation, it is then used for each channel in a ChannelFilter,
+    and blocks of samples are filtered for all channels at once if filterer can be vectorized.
+    Otherwise, filterer filters all channels of each window at once (see WindowFilter).
+    """
+    if isinstance(filterer, type) and issubclass(filterer, WindowFilter):
+        streaming_filter = filterer
+    else:
+        try:
+            streaming_filter = STREAMING_FILTERS.get(filterer)
+        except TypeError: # unhashable filterer
+            streaming_filter = None
+    if streaming_filter is None:
+        return WindowFilter(max_samples, filterer, num_channels)
+    if num_channels is not None:
+        return ChannelFilter(max_samples, filterer, num_channels, streaming_filter)
+    return streaming_filter(max_samples)
 
 @coroutines.initialized_coroutine
-def moving_filter(max_samples=None, filterer=np.median, mode="centered"):
+def moving_filter(max_samples=None, filterer=np.median, mode="centered", num_channels=None):
     """A coroutine to filter a signal using its max_samples most recent samples.
     To initialize, assign to a variable and start using it - no need to call the next
     function on it or send in an initial None value.
@@ -25,13 +474,20 @@ def moving_filter(max_samples=None, filterer=np.median, mode="centered"):
         max_samples: the window size over which to compute the filtered sample.
         To make the filter exactly symmetric in centered mode, set this to be an odd number. If this
         is None, the moving filter processes all samples and is effectively in right mode.
+        filterer: a function computing the filtered result from the window of samples, or a
+        WindowFilter subclass. Functions with a streaming implementation (such as np.median) are
+        automatically computed incrementally; see get_window_filter.
         mode: either "centered" or "right". If centered, the output sample number will correspond
         to the sample number for the (max_samples / 2)th most recent sample. If right, the output
         sample number will correspond to the sample number for the most recent sample.
+        num_channels: if not None, each value is a sequence of the values of this many channels,
+        which are filtered at once with a vectorized filterer; see get_window_filter.
 
     Sending:
         Send a two-tuple of the sample number (or sample time) and value into moving_filter to add
         that sample to the signal for filtering.
+        Send a two-tuple of NumPy arrays of sample numbers (or sample times) and values into
+        moving_filter to add that block of samples to the signal for filtering.
         Send a positive integer into moving_filter to reset the signal and set the filter to use
         that integer as the new value of max_samples
         Send None into moving_filter to reset the signal.
@@ -41,32 +497,203 @@ def moving_filter(max_samples=None, filterer=np.median, mode="centered"):
         Otherwise, a two-tuple of the sample number (or sample time) for the filtered sample and
         the filtered result (as computed by filterer) of the max_samples most recent samples.
         The sample number will be calculated depending on the mode argument.
+        For a block of samples, a two-tuple of NumPy arrays of the sample numbers (or sample times)
+        and filtered results for all filtered samples which became available in that block. The
+        arrays are empty if the filter has not yet collected max_samples samples.
     """
-    signal_buffer = deque(maxlen=max_samples)
-    sample_numbers = deque(maxlen=(max_samples // 2 + 1
-                                   if max_samples is not None else None))
+    window = get_window_filter(filterer, max_samples, num_channels)
+    sample_numbers = None # created for the type of the first sample numbers sent in
     filtered = None
     while True:
         value = yield filtered
         if isinstance(value, int):
             max_samples = value
+            window = get_window_filter(filterer, max_samples, num_channels)
             value = None
         if value is None: # reset the signal
-            signal_buffer = deque(maxlen=max_samples)
-            sample_numbers = deque(maxlen=(max_samples // 2 + 1
-                                           if max_samples is not None else None))
+            window.clear()
+            sample_numbers = None
             filtered = None
+        elif isinstance(value[0], np.ndarray):
+            if sample_numbers is None:
+                sample_numbers = _sample_number_buffer(max_samples, value[0].dtype)
+            previous_sample_numbers = sample_numbers.snapshot()
+            num_previous = len(window)
+            sample_numbers.extend(value[0])
+            results = window.extend(value[1])
+            if max_samples is None or mode == "right":
+                filtered = (value[0], results)
+            elif mode == "centered":
+                first = max(0, max_samples - 1 - num_previous) # first result with a full window
+                offset = len(previous_sample_numbers) - max_samples // 2
+                all_sample_numbers = np.concatenate((previous_sample_numbers, value[0]))
+                filtered = (all_sample_numbers[offset + first:offset + len(value[0])],
+                            results[first:])
+            else:
+                filtered = None
         else:
+            if sample_numbers is None:
+                sample_numbers = _sample_number_buffer(max_samples, object)
             sample_numbers.append(value[0])
-            signal_buffer.append(value[1])
-            num_samples = len(signal_buffer)
+            window.append(value[1])
+            num_samples = len(window)
             if max_samples is None or mode == "right":
-                filtered = (sample_numbers[-1], filterer(signal_buffer))
+                filtered = (sample_numbers[-1], window.result())
             elif num_samples == max_samples and mode == "centered":
-                filtered = (sample_numbers[0], filterer(signal_buffer))
+                filtered = (sample_numbers[0], window.result())
             else:
                 filtered = None
 
+def _sample_number_buffer(max_samples, dtype):
+    """Returns a buffer of the sample numbers needed to find the sample number of each filtered
+    sample. Single sample numbers are stored as objects, so that they are output exactly as they
+    were sent in.
+    """
+    return buffers.RingBuffer(max_samples // 2 + 1 if max_samples is not None else 1, dtype)
+
+@coroutines.initialized_coroutine
+def min_max_decimator(bucket_width):
+    """A coroutine to decimate a signal into the minimum and maximum samples of each time bucket.
+    Samples are grouped into consecutive buckets spanning bucket_width of time, such as the time
+    spanned by one pixel of a plot. Once a sample arrives in a later bucket, the previous bucket
+    is complete, and its minimum and maximum samples are output in chronological order. Thus at
+    most two samples are output per bucket, but spikes in the signal are never dropped.
+    To initialize, assign to a variable and start using it - no need to call the next
+    function on it or send in an initial None value.
+
+    Sending:
+        Send a two-tuple of the sample time and value into min_max_decimator to add that sample to
+        the signal for decimation.
+        Send a two-tuple of NumPy arrays of sample times and values into min_max_decimator to add
+        that block of samples to the signal for decimation.
+        Send a positive number into min_max_decimator to reset the signal and set the decimator
+        to use that number as the new value of bucket_width.
+        Send None into min_max_decimator to reset the signal.
+
+    Yielding:
+        None: if a single sample was sent and it did not complete a bucket.
+        Otherwise, a two-tuple of NumPy arrays of the times and values of the decimated samples
+        of all buckets completed by the samples which were sent. The arrays may be empty.
+    """
+    bucket = None # (bucket index, min time, min value, max time, max value)
+    decimated = None
+    while True:
+        value = yield decimated
+        decimated = None
+        if isinstance(value, (int, float)):
+            bucket_width = value
+            value = None
+        if value is None: # reset the signal
+            bucket = None
+            continue
+        (times, values) = value
+        if isinstance(times, np.ndarray):
+            segments = [(index, times[start:end], values[start:end]) for (index, start, end)
+                        in _bucket_segments(np.floor_divide(times, bucket_width))]
+        else:
+            segments = [(times // bucket_width, (times,), (values,))]
+        decimated_times = []
+        decimated_values = []
+        for (index, segment_times, segment_values) in segments:
+            if len(segment_times) == 1:
+                (min_position, max_position) = (0, 0)
+            else:
+                (min_position, max_position) = (np.argmin(segment_values),
+                                                np.argmax(segment_values))
+            bucket_extrema = (index, segment_times[min_position], segment_values[min_position],
+                              segment_times[max_position], segment_values[max_position])
+            if bucket is None:
+                bucket = bucket_extrema
+            elif bucket[0] == index:
+                (_, min_time, min_value, max_time, max_value) = bucket
+                if bucket_extrema[2] < min_value:
+                    (min_time, min_value) = bucket_extrema[1:3]
+                if bucket_extrema[4] > max_value:
+                    (max_time, max_value) = bucket_extrema[3:5]
+                bucket = (index, min_time, min_value, max_time, max_value)
+            else:
+                _output_bucket(bucket, decimated_times, decimated_values)
+                bucket = bucket_extrema
+        if decimated_times or isinstance(times, np.ndarray):
+            decimated = (np.array(decimated_times, dtype=float),
+                         np.array(decimated_values, dtype=float))
+
+def _bucket_segments(bucket_indices):
+    """Generates the bucket index, start, and end of each run of equal consecutive bucket
+    indices.
+    """
+    boundaries = np.concatenate(([0], np.flatnonzero(np.diff(bucket_indices)) + 1,
+                                 [len(bucket_indices)]))
+    for (start, end) in zip(boundaries[:-1], boundaries[1:]):
+        yield (bucket_indices[start], start, end)
+
+def _output_bucket(bucket, decimated_times, decimated_values):
+    """Appends the minimum and maximum samples of a bucket in chronological order."""
+    (_, min_time, min_value, max_time, max_value) = bucket
+    if min_time == max_time:
+        decimated_times.append(min_time)
+        decimated_values.append(min_value)
+    elif min_time < max_time:
+        decimated_times.extend((min_time, max_time))
+        decimated_values.extend((min_value, max_value))
+    else:
+        decimated_times.extend((max_time, min_time))
+        decimated_values.extend((max_value, min_value))
+
+class Decimator(actors.BoundedMailbox, actors.Broadcaster, pykka.ThreadingActor):
+    """Decimates samples of a signal for plotting, preserving the signal's peaks.
+    Each bucket of bucket_width of time is reduced to its minimum and maximum samples, so a curve
+    spanning a long time can be drawn with a bounded number of points by setting bucket_width to
+    the time spanned by one pixel of the plot.
+
+    Public Messages:
+        Data (received):
+            Data messages should have a time entry holding the time of the data sample,
+            corresponding to the x axis value.
+            The data entry should specify the value of the data sample, corresponding to the
+            y axis value.
+            A batch of samples can be sent in a single data message whose time and data entries
+            are NumPy arrays of the times and values of consecutive samples.
+            Data messages can be dicts or messages.Sample instances.
+        Command (received):
+            clear: clears the decimator.
+        Data (broadcasted):
+            Batch data messages whose time and data entries are NumPy arrays holding the times and
+            values of the decimated samples of each completed bucket.
+            The type entry specifies the type of the data sample, and the data is broadcasted on
+            the channel named by that type.
+            Batches decimated from messages.Sample instances are broadcast as
+            messages.SampleBatch instances.
+    """
+    def __init__(self, bucket_width):
+        super().__init__()
+        self.decimator = min_max_decimator(bucket_width)
+
+    @instrumentation.instrumented
+    def on_receive(self, message):
+        if 'command' in message:
+            self.__on_command(message)
+        else:
+            self.__on_data(message)
+
+    def __on_command(self, message):
+        """Processes command messages."""
+        if message['command'] == 'clear':
+            self.decimator.send(None)
+
+    def __on_data(self, message):
+        """Processes data messages."""
+        decimated = self.decimator.send((message['time'], message['data']))
+        if decimated is None or not len(decimated[0]):
+            return
+        if isinstance(message, messages.Sample):
+            new_message = messages.SampleBatch(message.type, decimated[0], decimated[1])
+        else:
+            new_message = message.copy()
+            new_message['time'] = decimated[0]
+            new_message['data'] = decimated[1]
+        self.broadcast(new_message, new_message['type'])
+
 class Filterer(actors.Broadcaster, pykka.ThreadingActor):
     """Filters samples of a signal.
 
@@ -76,6 +703,10 @@ class Filterer(actors.Broadcaster, pykka.ThreadingActor):
             corresponding to the x axis value.
             The data entry should specify the value of the data sample, corresponding to the
             y axis value.
+            A batch of samples can be sent in a single data message whose time and data entries
+            are NumPy arrays of the times and values of consecutive samples.
+            Data messages can be dicts or messages.Sample instances, and are broadcast with the
+            same type.
         Command (received):
             clear: clears the filterer.
         Data (broadcasted):
@@ -84,11 +715,19 @@ class Filterer(actors.Broadcaster, pykka.ThreadingActor):
             the channel named by that type.
             The data entry specifies the value of the data sample.
             The data sample will be a filtered value.
+            If the Filterer's broadcast_channels property is set to be not-None, the filtered
+            value must be a tuple (as computed by ExtremaFilter, for example), and each value of
+            the tuple is broadcasted as a separate data message whose type entry is changed to be
+            the corresponding channel of broadcast_channels.
+            Batches of samples are filtered and broadcasted as a single batch data message.
     """
-    def __init__(self, filter_width=None, filterer=np.median, mode="centered"):
+    def __init__(self, filter_width=None, filterer=np.median, mode="centered",
+                 broadcast_channels=None):
         super().__init__()
         self.filterer = moving_filter(filter_width, filterer, mode)
+        self.broadcast_channels = broadcast_channels
 
+    @instrumentation.instrumented
     def on_receive(self, message):
         if 'command' in message:
             self.__on_command(message)
@@ -102,17 +741,110 @@ class Filterer(actors.Broadcaster, pykka.ThreadingActor):
 
     def __on_data(self, message):
         """Processes data messages."""
+        is_batch = isinstance(message['time'], np.ndarray)
         filtered = self.filterer.send((message['time'], message['data']))
-        if filtered is not None:
-            new_message = dict(message)
+        if filtered is None or (is_batch and not len(filtered[0])):
+            return
+        if self.broadcast_channels is None:
+            new_message = message.copy()
             new_message['time'] = filtered[0]
             new_message['data'] = filtered[1]
-            self.broadcast(new_message, message['type'])
+            self.broadcast(new_message, new_message['type'])
+            return
+        values = filtered[1].T if is_batch else filtered[1]
+        for (channel, value) in zip(self.broadcast_channels, values):
+            new_message = message.copy()
+            new_message['type'] = channel
+            new_message['time'] = filtered[0]
+            new_message['data'] = value
+            self.broadcast(new_message, channel)
 
     def __clear_filterer(self):
         """Clears the curve."""
         self.filterer.send(None)
 
+class MultiFilterer(actors.Broadcaster, pykka.ThreadingActor):
+    """Filters all channels of a multi-channel signal at once.
+    Single samples are filtered incrementally with a streaming filter for each channel, while
+    batches of samples are filtered for every channel with one vectorized NumPy evaluation over
+    a 2-D window; see get_window_filter. This replaces a TupleSelector and a chain of Filterers
+    for each channel with a single actor.
+
+    Public Messages:
+        Data (received):
+            Data messages should have a time entry holding the time of the data sample.
+            The data entry should specify a tuple of the values of each channel of the data
+            sample. For a batch data message, the data entry should be a 2-D NumPy array with
+            one row per sample.
+        Command (received):
+            clear: clears the filterer.
+        Data (broadcasted):
+            For each named channel, the following data messages are broadcasted, each with the
+            type entry set to the broadcast class it is broadcasted on:
+            (channel, 'raw'): the unfiltered values of the channel.
+            channel: the filtered values of the channel.
+            (channel, 'min') and (channel, 'max'): if envelope_width is not None, the minimum and
+            maximum of the envelope_width most recent filtered values of the channel.
+            Batches of samples are filtered and broadcasted as batch data messages.
+
+    Arguments:
+        channels: the names of the channels, in the order of the values in each data tuple.
+        Channels named None are filtered but not broadcasted.
+        filterer: a NumPy function which accepts an axis argument, such as np.median.
+        envelope_width: if not None, the window size for the envelope of the filtered values.
+    """
+    def __init__(self, channels, filter_width=None, filterer=np.median, mode="centered",
+                 envelope_width=None):
+        super().__init__()
+        self.channels = tuple(channels)
+        num_channels = len(self.channels)
+        self.filterer = moving_filter(filter_width, filterer, mode, num_channels)
+        self.envelope_filterer = (moving_filter(envelope_width, extrema, "right", num_channels)
+                                  if envelope_width is not None else None)
+
+    @instrumentation.instrumented
+    def on_receive(self, message):
+        if 'command' in message:
+            self.__on_command(message)
+        else:
+            self.__on_data(message)
+
+    def __on_command(self, message):
+        """Processes command messages."""
+        if message['command'] == 'clear':
+            self.filterer.send(None)
+            if self.envelope_filterer is not None:
+                self.envelope_filterer.send(None)
+
+    def __on_data(self, message):
+        """Processes data messages."""
+        is_batch = isinstance(message['time'], np.ndarray)
+        values = np.asarray(message['data'], dtype=float)
+        self.__broadcast_channels(message, message['time'], values, is_batch, 'raw')
+        filtered = self.filterer.send((message['time'], values))
+        if filtered is None or (is_batch and not len(filtered[0])):
+            return
+        self.__broadcast_channels(message, filtered[0], filtered[1], is_batch)
+        if self.envelope_filterer is None:
+            return
+        envelope = self.envelope_filterer.send(filtered)
+        if envelope is None or (is_batch and not len(envelope[0])):
+            return
+        self.__broadcast_channels(message, envelope[0], envelope[1][..., 0], is_batch, 'min')
+        self.__broadcast_channels(message, envelope[0], envelope[1][..., 1], is_batch, 'max')
+
+    def __broadcast_channels(self, message, sample_time, values, is_batch, suffix=None):
+        """Broadcasts the values of each channel as a separate data message."""
+        for (position, channel) in enumerate(self.channels):
+            if channel is None:
+                continue
+            broadcast_class = channel if suffix is None else (channel, suffix)
+            new_message = message.copy()
+            new_message['type'] = broadcast_class
+            new_message['time'] = sample_time
+            new_message['data'] = values[:, position] if is_batch else values[position]
+            self.broadcast(new_message, broadcast_class)
+
 class TupleSelector(actors.Broadcaster, pykka.ThreadingActor):
     """Filters a signal data from tuple-form to a single value, discarding other values.
 
@@ -120,7 +852,8 @@ class TupleSelector(actors.Broadcaster, pykka.ThreadingActor):
         Data (received):
             The type entry specifies the type of data message
             The data entry should specify a tuple of values of the data sample, corresponding to
-            the y axis values.
+            the y axis values. For a batch data message, the data entry should be a 2-D NumPy
+            array with one row per sample.
         Data (broadcasted):
             The type entry specifies the type of the data sample, and the data is broadcasted on
             the channel named by that type. If the TupleSelector's broadcast_channel property
@@ -134,9 +867,13 @@ class TupleSelector(actors.Broadcaster, pykka.ThreadingActor):
         self.tuple_position = tuple_position
         self.broadcast_channel = broadcast_channel
 
+    @instrumentation.instrumented
     def on_receive(self, message):
-        new_message = dict(message)
-        new_message['data'] = message['data'][self.tuple_position]
+        new_message = message.copy()
+        if isinstance(message['time'], np.ndarray):
+            new_message['data'] = message['data'][:, self.tuple_position]
+        else:
+            new_message['data'] = message['data'][self.tuple_position]
         if self.broadcast_channel is not None:
             new_message['type'] = self.broadcast_channel
         self.broadcast(new_message, new_message['type'])
@@ -0,0 +1,490 @@
+"""Emulates the Arduino boards of the leg model test fixture and the sleeve, for testing and
+benchmarking without hardware. The emulated boards speak the serial protocols of the nanpy
+firmware and of the LegStreaming sketch, either on pseudo-terminals, which programs open like
+serial ports, or directly to nanpy in the same process. The sensor readings of the leg come from
+a synthetic model of the fluid pressures which responds to the positions of the sleeve's servos:
+
+    pressure_model = simulator.LegPressureModel()
+    leg_board = simulator.NanpyDevice(simulator.NanpyFirmware(pressure_model=pressure_model))
+    sleeve_board = simulator.NanpyDevice(simulator.NanpyFirmware(pressure_model=pressure_model))
+    leg_board.start()
+    sleeve_board.start()
+    leg_monitor = leg.LegMonitor.start(leg.Leg(nanpy.SerialManager(leg_board.device)))
+"""
+# Python imports
+import os
+import tty
+import time
+import math
+import random
+import select
+import struct
+import threading
+import collections
+
+# Package imports
+from verasleeve import clocks, leg
+
+# Emulated device parameters
+ROUND_TRIP_TIME = 0.002 # s per request and response; roughly that of nanpy over USB serial
+ANALOG_READ_MAX = 1023
+TICK_INTERVAL = 0.001 # s between checks of pseudo-terminal devices for work to do
+
+class LegPressureModel(object):
+    """Synthetic fluid pressures in the vein of the leg model, which respond to the contraction
+    of the sleeve.
+    Each pressure is a baseline, plus a slow ripple, plus a contraction pressure which follows
+    the mean contraction of the sleeve bands with a first-order lag. The contraction of each band
+    is computed from the most recent position written to its servo. The raw readings of the
+    fluid pressure sensors are computed from the pressures by inverting the default linear
+    calibrations of the leg module, with noise, and saturate at the range of the ADC.
+    Instances are thread-safe, so that the emulated boards of the leg and of the sleeve can
+    share an instance. The pressures are functions of the time on the clock of the instance, so
+    that on a clocks.VirtualClock and with a seed they are reproducible.
+
+    Arguments:
+        top_baseline: the pressure at the top of the vein without contraction, in mmHg.
+        bottom_baseline: the pressure at the bottom of the vein without contraction, in mmHg.
+        contraction_pressure: the pressure added when all bands are fully contracted, in mmHg.
+        time_constant: the time constant of the lag of the contraction pressure, in seconds.
+        ripple: the amplitude of the ripple, in mmHg.
+        ripple_period: the period of the ripple, in seconds.
+        noise: the standard deviation of the noise of the raw readings.
+        uncontracted_position: the servo position of an uncontracted band.
+        contracted_position: the servo position of a fully contracted band.
+        clock: the clock of the instance. Defaults to a clocks.RealClock.
+        seed: the seed of the noise.
+    """
+    def __init__(self, top_baseline=20, bottom_baseline=40, contraction_pressure=50,
+                 time_constant=0.5, ripple=2, ripple_period=4, noise=1,
+                 uncontracted_position=130, contracted_position=50, clock=None, seed=None):
+        super().__init__()
+        if clock is None:
+            clock = clocks.RealClock()
+        self.clock = clock
+        self.top_baseline = top_baseline
+        self.bottom_baseline = bottom_baseline
+        self.contraction_pressure = contraction_pressure
+        self.time_constant = time_constant
+        self.ripple = ripple
+        self.ripple_period = ripple_period
+        self.noise = noise
+        self.uncontracted_position = uncontracted_position
+        self.contracted_position = contracted_position
+        self.__servo_positions = {}
+        self.__contraction = 0.0
+        self.__start_time = clock.now()
+        self.__last_update_time = self.__start_time
+        self.__random = random.Random(seed)
+        self.__lock = threading.Lock()
+        self.__pin_calibrations = {
+            leg.TOP_LOW_FLUID_SENSOR_PIN: ('top', leg.TOP_LOW_FLUID_PRESSURE_RAW_TO_MMHG),
+            leg.TOP_HIGH_FLUID_SENSOR_PIN: ('top', leg.TOP_HIGH_FLUID_PRESSURE_RAW_TO_MMHG),
+            leg.BOTTOM_FLUID_SENSOR_PIN: ('bottom', leg.BOTTOM_FLUID_PRESSURE_RAW_TO_MMHG)
+        }
+
+    def set_servo_position(self, servo_pin, position):
+        """Records the position written to a servo of the sleeve."""
+        with self.__lock:
+            self.__update(self.clock.now())
+            self.__servo_positions[servo_pin] = position
+    def reset_servos(self):
+        """Forgets all servo positions, e.g. when the sleeve's board resets."""
+        with self.__lock:
+            self.__update(self.clock.now())
+            self.__servo_positions.clear()
+
+    def get_pressures(self, sample_time=None):
+        """Returns a 2-tuple of the pressures at the top and bottom of the vein, in mmHg, at the
+        specified time on the clock of the instance. Defaults to the current time.
+        """
+        if sample_time is None:
+            sample_time = self.clock.now()
+        with self.__lock:
+            self.__update(sample_time)
+            contraction = self.__contraction
+        ripple = self.ripple * math.sin(2 * math.pi * (sample_time - self.__start_time)
+                                        / self.ripple_period)
+        contraction_pressure = self.contraction_pressure * contraction + ripple
+        return (self.top_baseline + contraction_pressure,
+                self.bottom_baseline + contraction_pressure)
+    def analog_read(self, pin, sample_time=None):
+        """Returns the raw reading of the fluid pressure sensor on the specified analog pin at
+        the specified time, or 0 if the pin has no fluid pressure sensor.
+        """
+        if pin not in self.__pin_calibrations:
+            return 0
+        (location, raw_to_pressure) = self.__pin_calibrations[pin]
+        (top_pressure, bottom_pressure) = self.get_pressures(sample_time)
+        pressure = top_pressure if location == 'top' else bottom_pressure
+        reading = raw_to_pressure.offset + raw_to_pressure.scale * pressure
+        with self.__lock:
+            noise = self.__random.gauss(0, self.noise)
+        return _clip_reading(reading + noise)
+
+    def __update(self, now):
+        """Advances the lagged contraction to the specified time."""
+        elapsed_time = now - self.__last_update_time
+        if elapsed_time <= 0:
+            return
+        target = (sum(self.__get_contraction(position)
+                      for position in self.__servo_positions.values())
+                  / len(self.__servo_positions)) if self.__servo_positions else 0.0
+        self.__contraction += ((target - self.__contraction)
+                               * (1 - math.exp(-elapsed_time / self.time_constant)))
+        self.__last_update_time = now
+    def __get_contraction(self, position):
+        contraction = ((self.uncontracted_position - position)
+                       / (self.uncontracted_position - self.contracted_position))
+        return min(max(contraction, 0.0), 1.0)
+
+class NanpyFirmware(object):
+    """Emulates the nanpy firmware on an Arduino.
+    Supports the Info class which nanpy uses to check the features of the firmware, the analog
+    and digital pin methods of the Arduino core class, the AnalogArray class from
+    ext/nanpy-firmware-classes (unless it is left out), and the Servo and Watchdog classes.
+    Positions written to servos are passed to the pressure model. Enabling the watchdog resets
+    the emulated board immediately, which detaches all servos.
+
+    Arguments:
+        analog_waveforms: a dict of the waveforms of the raw readings of analog pins, as
+        functions of the time in seconds since the firmware was created, on the clock of the
+        pressure model. Readings of pins without a waveform come from the pressure model.
+        pressure_model: the LegPressureModel of the leg model. Defaults to a new instance.
+        analog_array: whether the firmware has the AnalogArray class, as when it is built
+        after running setup.py. If not, the emulated firmware is that of a stock nanpy build.
+    """
+    def __init__(self, analog_waveforms=None, pressure_model=None, analog_array=True):
+        super().__init__()
+        if analog_waveforms is None:
+            analog_waveforms = {}
+        if pressure_model is None:
+            pressure_model = LegPressureModel()
+        self.analog_waveforms = analog_waveforms
+        self.pressure_model = pressure_model
+        self.digital_pins = {}
+        self.servos = [] # the pin and position of each servo, indexed by object id
+        self.clock = pressure_model.clock
+        self.__start_time = self.clock.now()
+        self.__classes = collections.OrderedDict((
+            ('Info', self.__on_info),
+            ('A', self.__on_arduino_core),
+            ('AnalogArray', self.__on_analog_array),
+            ('Servo', self.__on_servo),
+            ('Watchdog', self.__on_watchdog)
+        ))
+        if not analog_array:
+            del self.__classes['AnalogArray']
+
+    def handle(self, class_name, object_id, method, args):
+        """Handles a nanpy request and returns the response.
+
+        Arguments:
+            class_name: the firmware id of the class of the method.
+            object_id: the id of the object of the method, for classes with instances.
+            method: the name of the method.
+            args: a list of the arguments of the method, as strings.
+
+        Returns:
+            The line of the response, as a string without the line terminator.
+
+        Exceptions:
+            ValueError: the firmware doesn't have the specified class or method.
+        """
+        try:
+            handler = self.__classes[class_name]
+        except KeyError:
+            raise ValueError("Unknown firmware class {}".format(class_name)) from None
+        return str(handler(int(object_id), method, args))
+
+    def analog_read(self, pin):
+        """Returns the current raw reading of the specified analog pin."""
+        if pin in self.analog_waveforms:
+            return read_waveform(self.analog_waveforms, pin, self.clock.now() - self.__start_time)
+        return self.pressure_model.analog_read(pin)
+    def reset(self):
+        """Resets the emulated board."""
+        self.digital_pins.clear()
+        self.servos.clear()
+        self.pressure_model.reset_servos()
+
+    def __on_info(self, object_id, method, args):
+        if method == 'count':
+            return len(self.__classes)
+        elif method == 'name':
+            return list(self.__classes)[int(args[0])]
+        raise ValueError("Unknown method Info.{}".format(method))
+    def __on_arduino_core(self, object_id, method, args):
+        # nanpy abbreviates the names of these methods to shorten the requests
+        if method == 'a': # analogRead
+            return self.analog_read(int(args[0]))
+        elif method == 'r': # digitalRead
+            return self.digital_pins.get(int(args[0]), 0)
+        elif method in ('dw', 'aw'): # digitalWrite, analogWrite
+            self.digital_pins[int(args[0])] = int(args[1])
+            return 0
+        elif method == 'pm': # pinMode
+            return 0
+        raise ValueError("Unknown method A.{}".format(method))
+    def __on_analog_array(self, object_id, method, args):
+        if method == 'read':
+            return ' '.join(str(self.analog_read(int(pin))) for pin in args)
+        raise ValueError("Unknown method AnalogArray.{}".format(method))
+    def __on_servo(self, object_id, method, args):
+        if method == 'new':
+            self.servos.append([int(args[0]), None])
+            return len(self.servos) - 1
+        servo = self.servos[object_id]
+        if method == 'write':
+            servo[1] = int(args[0])
+            self.pressure_model.set_servo_position(servo[0], servo[1])
+            return 0
+        elif method == 'read':
+            return servo[1] if servo[1] is not None else 0
+        elif method in ('attach', 'detach'):
+            return 0
+        raise ValueError("Unknown method Servo.{}".format(method))
+    def __on_watchdog(self, object_id, method, args):
+        if method == 'enable':
+            self.reset()
+            return 0
+        elif method in ('reset', 'disable'):
+            return 0
+        raise ValueError("Unknown method Watchdog.{}".format(method))
+
+class NanpyRequestParser(object):
+    """Splits the data received by an emulated board into nanpy requests for its firmware.
+
+    Arguments:
+        firmware: the NanpyFirmware handling requests.
+    """
+    def __init__(self, firmware):
+        super().__init__()
+        self.firmware = firmware
+        self.__partial_field = ''
+        self.__fields = []
+
+    def parse(self, data):
+        """Handles each nanpy request completed by the received data.
+
+        Returns:
+            A list of the responses to the completed requests, without line terminators.
+        """
+        if isinstance(data, bytes):
+            data = data.decode()
+        fields = (self.__partial_field + data).split('\0')
+        self.__partial_field = fields.pop()
+        self.__fields.extend(fields)
+        responses = []
+        # Requests are the class name, object id, number of arguments, method name, and arguments
+        while len(self.__fields) >= 4 and len(self.__fields) >= 4 + int(self.__fields[2]):
+            (class_name, object_id, num_args, method) = self.__fields[:4]
+            request_length = 4 + int(num_args)
+            args = self.__fields[4:request_length]
+            del self.__fields[:request_length]
+            responses.append(self.firmware.handle(class_name, object_id, method, args))
+        return responses
+
+class EmulatedSerialManager(object):
+    """Stands in for a nanpy.SerialManager connected to an Arduino running the nanpy firmware,
+    without a serial port. Passes each complete request written to it to the emulated firmware,
+    and waits for the round trip time before returning each response, like a real serial
+    connection.
+
+    Arguments:
+        firmware: the NanpyFirmware handling requests. Defaults to a new NanpyFirmware.
+        round_trip_time: the time in seconds taken by each request and response.
+    """
+    def __init__(self, firmware=None, round_trip_time=ROUND_TRIP_TIME):
+        super().__init__()
+        if firmware is None:
+            firmware = NanpyFirmware()
+        self.firmware = firmware
+        self.round_trip_time = round_trip_time
+        self.device = 'emulated'
+        self.__parser = NanpyRequestParser(firmware)
+        self.__responses = collections.deque()
+
+    def open(self, device=None):
+        pass
+    def close(self):
+        pass
+    def flush_input(self):
+        self.__responses.clear()
+
+    def write(self, value):
+        """Receives part of a request."""
+        self.__responses.extend(self.__parser.parse(value))
+    def readline(self):
+        """Returns the next response, without its line terminator."""
+        if not self.__responses:
+            raise TimeoutError("Serial timeout!")
+        time.sleep(self.round_trip_time)
+        return self.__responses.popleft()
+
+class PseudoTerminalDevice(object):
+    """Emulates a device connected over a serial port, on a pseudo-terminal.
+    Programs open the device path of the instance like the path of a serial port. A thread
+    passes the data written by the program to _on_receive, and calls _on_tick after that and at
+    least every TICK_INTERVAL, until the instance is stopped. Data which the program doesn't read
+    fast enough to fit in the buffer of the pseudo-terminal is discarded and counted, like a
+    serial port whose buffer overflows.
+
+    Abstract methods:
+        _on_receive: handles data received from the program.
+        _on_tick: hook for periodic work, e.g. sending data to the program.
+    """
+    def __init__(self):
+        super().__init__()
+        (self.__master, self.__slave) = os.openpty()
+        tty.setraw(self.__slave)
+        os.set_blocking(self.__master, False)
+        self.device = os.ttyname(self.__slave)
+        self.num_overflowed_bytes = 0
+        self.__running = threading.Event()
+        self.__thread = None
+
+    def start(self):
+        """Starts emulating the device. Returns the instance."""
+        self.__running.set()
+        self.__thread = threading.Thread(target=self.__run, daemon=True,
+                                         name='{} {}'.format(self.__class__.__name__, self.device))
+        self.__thread.start()
+        return self
+    def stop(self):
+        """Stops emulating the device and closes the pseudo-terminal."""
+        self.__running.clear()
+        if self.__thread is not None:
+            self.__thread.join()
+        os.close(self.__master)
+        os.close(self.__slave)
+
+    def _write(self, data):
+        """Sends data to the program."""
+        try:
+            num_written = os.write(self.__master, data)
+        except BlockingIOError:
+            num_written = 0
+        self.num_overflowed_bytes += len(data) - num_written
+
+    def __run(self):
+        while self.__running.is_set():
+            (readable, _, _) = select.select([self.__master], [], [], TICK_INTERVAL)
+            if readable:
+                try:
+                    self._on_receive(os.read(self.__master, 4096))
+                except BlockingIOError:
+                    pass
+            self._on_tick()
+
+    def _on_receive(self, data):
+        pass
+    def _on_tick(self):
+        pass
+
+class NanpyDevice(PseudoTerminalDevice):
+    """Emulates an Arduino running the nanpy firmware on a pseudo-terminal, so that a
+    nanpy.SerialManager for the device path of the instance connects to it like to a real board.
+    Sends the response to each request after a configurable latency.
+
+    Arguments:
+        firmware: the NanpyFirmware handling requests. Defaults to a new NanpyFirmware.
+        latency: the time in seconds between receiving a request and sending its response.
+    """
+    def __init__(self, firmware=None, latency=ROUND_TRIP_TIME):
+        super().__init__()
+        if firmware is None:
+            firmware = NanpyFirmware()
+        self.firmware = firmware
+        self.latency = latency
+        self.__parser = NanpyRequestParser(firmware)
+        self.__responses = collections.deque() # pairs of send times and responses
+
+    def _on_receive(self, data):
+        send_time = time.monotonic() + self.latency
+        self.__responses.extend((send_time, (response + '\r\n').encode())
+                                for response in self.__parser.parse(data))
+    def _on_tick(self):
+        now = time.monotonic()
+        while self.__responses and self.__responses[0][0] <= now:
+            self._write(self.__responses.popleft()[1])
+
+class StreamingLegDevice(PseudoTerminalDevice):
+    """Emulates the Arduino of the leg model test fixture running the LegStreaming sketch.
+    Sends a frame for each sampling deadline on the emulated clock of the board; see the sketch
+    for the frame format and commands.
+
+    Arguments:
+        analog_waveforms: a dict of the waveforms of the raw readings of analog pins, as
+        functions of the time in seconds since the board was booted. Readings of pins without
+        a waveform come from the pressure model.
+        pressure_model: the LegPressureModel of the leg model, which must be on a
+        clocks.RealClock since the board streams in real time. Defaults to a new instance.
+        pins: the analog pins whose readings are sent in each frame.
+        boot_micros: the value of micros() on the board when the instance is created, e.g. to
+        test the handling of micros() wrapping around.
+    """
+    def __init__(self, analog_waveforms=None, pressure_model=None, pins=leg.FLUID_SENSOR_PINS,
+                 boot_micros=0):
+        super().__init__()
+        if analog_waveforms is None:
+            analog_waveforms = {}
+        if pressure_model is None:
+            pressure_model = LegPressureModel()
+        self.analog_waveforms = analog_waveforms
+        self.pressure_model = pressure_model
+        self.pins = pins
+        self.__frame_format = struct.Struct('<HI{}H'.format(len(pins)))
+        self.__boot_time = time.monotonic() - boot_micros / 1e6
+        self.__commands = bytearray()
+        self.__interval = None
+        self.__next_sample_time = None
+        self.__sequence = 0
+
+    def _on_receive(self, data):
+        self.__commands += data
+        while self.__commands:
+            if self.__commands[0] == ord('S'):
+                if len(self.__commands) < 5: # wait for the rest of the command
+                    return
+                interval = struct.unpack('<I', self.__commands[1:5])[0] or 2000
+                del self.__commands[:5]
+                self.__interval = interval / 1e6
+                self.__next_sample_time = time.monotonic()
+                self.__sequence = 0
+            else:
+                if self.__commands[0] == ord('X'):
+                    self.__interval = None
+                del self.__commands[:1]
+    def _on_tick(self):
+        if self.__interval is None:
+            return
+        now = time.monotonic()
+        frames = []
+        while self.__next_sample_time <= now:
+            frames.append(self.__get_frame(self.__next_sample_time))
+            self.__next_sample_time += self.__interval
+        if frames:
+            self._write(b''.join(frames))
+
+    def __get_frame(self, sample_time):
+        elapsed_time = sample_time - self.__boot_time
+        readings = [read_waveform(self.analog_waveforms, pin, elapsed_time)
+                    if pin in self.analog_waveforms
+                    else self.pressure_model.analog_read(pin, sample_time) for pin in self.pins]
+        body = self.__frame_format.pack(self.__sequence % 2 ** 16,
+                                        int(elapsed_time * 1e6) % 2 ** 32, *readings)
+        self.__sequence += 1
+        return b'\xa5\x5a' + body + bytes((sum(body) % 256,))
+
+def read_waveform(analog_waveforms, pin, elapsed_time):
+    """Returns the raw reading of an analog pin from its waveform at the specified time, or 0 if
+    the pin has no waveform.
+    """
+    waveform = analog_waveforms.get(pin)
+    if waveform is None:
+        return 0
+    return _clip_reading(waveform(elapsed_time))
+def _clip_reading(reading):
+    """Rounds a raw reading and clips it to the range of the ADC."""
+    return min(max(int(round(reading)), 0), ANALOG_READ_MAX)
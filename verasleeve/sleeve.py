@@ -1,6 +1,7 @@
 """Controls the Arduino board of the leg model test fixture and contractile sleeve."""
 # Python imports
-import time
+import bisect
+import collections
 
 # Dependency imports
 import nanpy
@@ -9,7 +10,7 @@ from serial.serialutil import SerialException
 import pykka
 
 # Package imports
-from verasleeve import actors
+from verasleeve import actors, clocks
 
 # Device parameters
 # These are servo motor pins
@@ -18,9 +19,18 @@ NUM_BANDS = len(BAND_SERVO_PINS)
 BAND_SERVO_IDS = list(range(NUM_BANDS))
 
 class SleeveServos(object):
-    """Models the Arduino controller of the leg sleeve."""
-    def __init__(self, connection=None):
+    """Models the Arduino controller of the leg sleeve.
+
+    Arguments:
+        connection: the nanpy connection to the Arduino. Defaults to a new nanpy.SerialManager.
+        clock: the clock on which to wait for the Arduino to reset. Defaults to a
+        clocks.RealClock.
+    """
+    def __init__(self, connection=None, clock=None):
         super().__init__()
+        if clock is None:
+            clock = clocks.RealClock()
+        self.clock = clock
         if connection is None:
             try:
                 connection = nanpy.SerialManager()
@@ -48,40 +58,44 @@ class SleeveServos(object):
         """
         watchdog = Watchdog(self.__connection)
         watchdog.enable(0)
-        time.sleep(0.2)
+        self.clock.sleep(0.2)
 
 class SleeveController(actors.Producer):
-    """An abstract actor to control the contractions of a leg sleeve."""
-    def __init__(self, uncontracted_pos, contracted_pos, sleeve_servos=None):
-        super().__init__()
+    """An abstract actor to control the contractions of a leg sleeve.
+    Contraction patterns are timed on the clock of the instance; see actors.Producer.
+    """
+    def __init__(self, uncontracted_pos, contracted_pos, sleeve_servos=None, clock=None):
+        super().__init__(clock=clock)
         if sleeve_servos is None:
-            sleeve_servos = SleeveServos()
+            sleeve_servos = SleeveServos(clock=self.clock)
         self.sleeve_servos = sleeve_servos
         self.connection_device = sleeve_servos.connection_device
-        self.__produce_start_time = None
+        self._produce_start_time = None
         self.uncontracted_pos = uncontracted_pos
         self.contracted_pos = contracted_pos
 
     def _on_start_producing(self):
-        self.__produce_start_time = time.time()
+        self._produce_start_time = self.clock.now()
     def _on_stop_producing(self):
-        self.__produce_start_time = None
+        self._produce_start_time = None
     def _on_produce(self):
         for servo_id in BAND_SERVO_IDS:
-            self.sleeve_servos.set_servo_position(servo_id, self.__get_position(servo_id))
-    def __get_position(self, servo_id):
-        return self.uncontracted_pos + int((self.contracted_pos - self.uncontracted_pos)
-                                           * self._get_fractional_position(servo_id))
+            self._set_fractional_position(servo_id, self._get_fractional_position(servo_id))
+    def _set_fractional_position(self, servo_id, fractional_position):
+        """Moves the specified servo to a position between 0 (uncontracted) and 1 (contracted)."""
+        self.sleeve_servos.set_servo_position(
+            servo_id, self.uncontracted_pos + int((self.contracted_pos - self.uncontracted_pos)
+                                                  * fractional_position))
 
     def on_stop(self):
         if self.sleeve_servos is not None:
             for servo_id in BAND_SERVO_IDS:
                 self.sleeve_servos.set_servo_position(servo_id, self.uncontracted_pos)
-            time.sleep(0.25)
+            self.clock.sleep(0.25)
             self.sleeve_servos.quit()
 
     def _time_since_produce_start(self):
-        return time.time() - self.__produce_start_time
+        return self.clock.now() - self._produce_start_time
     def _get_fractional_position(self, servo_id):
         """Abstract method returning a servo position for the specified servo.
         Should return as a value between 0 and 1, inclusive; when 0, servo is fully uncontracted,
@@ -90,37 +104,110 @@ class SleeveController(actors.Producer):
         pass
 
 class PeriodicSleeveController(SleeveController):
-    """Abstract actor to support sleeve controllers that behave periodically."""
-    def __init__(self, uncontracted_pos, contracted_pos, period, sleeve_servos):
-        super().__init__(uncontracted_pos, contracted_pos, sleeve_servos)
+    """Abstract actor to support sleeve controllers that behave periodically.
+    Contracts each band during one interval of each period. Instead of polling the positions of
+    all bands at every update interval, compiles the pattern into a schedule of the times within
+    a period at which bands contract or relax, and only moves servos at those transitions; the
+    update interval only limits how long the instance waits between handling messages. Changes
+    to the period or to the parameters of the pattern are checked at each transition, and take
+    effect from then on; changes to the servo positions of uncontracted and contracted bands take
+    effect at each band's next transition.
+
+    Abstract methods:
+        _get_contraction_interval: returns a 2-tuple of the times since the start of a period
+        after which and before which the specified band is contracted.
+    """
+    def __init__(self, uncontracted_pos, contracted_pos, period, sleeve_servos, clock=None):
+        super().__init__(uncontracted_pos, contracted_pos, sleeve_servos, clock)
         self.period = period
+        self.__schedule_parameters = None
+        self.__transition_times = [] # times since the start of the period
+        self.__transition_changes = [] # tuples of the servo ids and fractional positions to set
+        self.__next_transition = None # cycle number and index in the schedule
 
     def _time_since_cycle_start(self):
         return self._time_since_produce_start() % self.period
+    def _get_fractional_position(self, servo_id):
+        (contraction_start, contraction_end) = self._get_contraction_interval(servo_id)
+        return int(contraction_start < self._time_since_cycle_start() < contraction_end)
+    def _get_contraction_interval(self, servo_id):
+        pass
+
+    def _on_start_producing(self):
+        super()._on_start_producing()
+        self.__update_schedule()
+    def _on_produce(self):
+        if self.__get_schedule_parameters() != self.__schedule_parameters:
+            self.__update_schedule()
+        elif self.__next_transition is not None:
+            index = self.__next_transition[1]
+            for (servo_id, fractional_position) in self.__transition_changes[index]:
+                self._set_fractional_position(servo_id, fractional_position)
+    def _get_next_deadline(self, deadline):
+        if self.__next_transition is None: # check for changed parameters once per period
+            return deadline + self.period
+        while self.__get_transition_time(*self.__next_transition) <= deadline:
+            (cycle, index) = self.__next_transition
+            self.__next_transition = ((cycle, index + 1) if index + 1 < len(self.__transition_times)
+                                      else (cycle + 1, 0))
+        return self.__get_transition_time(*self.__next_transition)
+
+    def __get_schedule_parameters(self):
+        return (self.period, tuple(self._get_contraction_interval(servo_id)
+                                   for servo_id in BAND_SERVO_IDS))
+    def __update_schedule(self):
+        """Compiles the schedule of transitions, moves all bands to their current positions, and
+        finds the next transition.
+        """
+        self.__schedule_parameters = self.__get_schedule_parameters()
+        elapsed_time = self._time_since_produce_start()
+        cycle = int(elapsed_time // self.period)
+        cycle_time = elapsed_time - cycle * self.period
+        changes = collections.defaultdict(list)
+        for (servo_id, (contraction_start, contraction_end)) in zip(
+                BAND_SERVO_IDS, self.__schedule_parameters[1]):
+            (contraction_start, contraction_end) = (max(contraction_start, 0),
+                                                    min(contraction_end, self.period))
+            if contraction_start < contraction_end:
+                changes[contraction_start].append((servo_id, 1))
+                changes[contraction_end].append((servo_id, 0))
+            # Transitions at the current time count as having happened
+            self._set_fractional_position(
+                servo_id, int(contraction_start <= cycle_time < contraction_end))
+        self.__transition_times = sorted(changes)
+        self.__transition_changes = [tuple(changes[transition_time])
+                                     for transition_time in self.__transition_times]
+        if not self.__transition_times:
+            self.__next_transition = None
+            return
+        index = bisect.bisect_right(self.__transition_times, cycle_time)
+        self.__next_transition = ((cycle, index) if index < len(self.__transition_times)
+                                  else (cycle + 1, 0))
+    def __get_transition_time(self, cycle, index):
+        return (self._produce_start_time + cycle * self.period
+                + self.__transition_times[index])
 
 class AdditiveSleeveController(PeriodicSleeveController):
     """Contracts sleeve bands in an additive sequential square-wave manner."""
     def __init__(self, sleeve_servos=None, period=2 * (2 + NUM_BANDS),
                  base_duty=(1 - 1 / NUM_BANDS), delay_per_band=1 / (2 + NUM_BANDS),
-                 uncontracted_pos=130, contracted_pos=50):
-        super().__init__(uncontracted_pos, contracted_pos, period, sleeve_servos)
+                 uncontracted_pos=130, contracted_pos=50, clock=None):
+        super().__init__(uncontracted_pos, contracted_pos, period, sleeve_servos, clock)
         self.duty = base_duty
         self.delay_per_band = delay_per_band
 
-    def _get_fractional_position(self, servo_id):
-        unadjusted_time = self._time_since_cycle_start()
-        return int(unadjusted_time - self.delay_per_band * self.period * servo_id > 0
-                   and unadjusted_time < self.duty * self.period)
+    def _get_contraction_interval(self, servo_id):
+        return (self.delay_per_band * self.period * servo_id, self.duty * self.period)
 
 class IndependentSleeveController(PeriodicSleeveController):
     """Contracts sleeve bands in an independent sequential square-wave manner."""
     def __init__(self, sleeve_servos=None, period=2.5 * (2 + NUM_BANDS), duty=1 / NUM_BANDS,
-                 delay_per_band=0.8 / (2 + NUM_BANDS), uncontracted_pos=130, contracted_pos=50):
-        super().__init__(uncontracted_pos, contracted_pos, period, sleeve_servos)
+                 delay_per_band=0.8 / (2 + NUM_BANDS), uncontracted_pos=130, contracted_pos=50,
+                 clock=None):
+        super().__init__(uncontracted_pos, contracted_pos, period, sleeve_servos, clock)
         self.duty = duty
         self.delay_per_band = delay_per_band
 
-    def _get_fractional_position(self, servo_id):
-        adjusted_time = (self._time_since_cycle_start()
-                         - self.delay_per_band * self.period * servo_id)
-        return int(adjusted_time > 0 and adjusted_time < self.duty * self.period)
+    def _get_contraction_interval(self, servo_id):
+        contraction_start = self.delay_per_band * self.period * servo_id
+        return (contraction_start, contraction_start + self.duty * self.period)
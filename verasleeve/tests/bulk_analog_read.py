@@ -0,0 +1,53 @@
+#!/usr/bin/env python3
+"""Tests reading all fluid pressure sensors of the leg in a single round trip, on an emulated
+Arduino running the nanpy firmware with the AnalogArray class, and reading them separately on an
+emulated Arduino running a stock nanpy build without it.
+"""
+# Python imports
+import logging
+import time
+
+# Package imports
+from .. import leg, simulator
+
+logging.basicConfig(level=logging.INFO)
+
+NUM_READS = 200
+
+def compare_reads():
+    """Checks that bulk reads give the same readings as separate reads, and compares how long
+    they take.
+    """
+    logger = logging.getLogger(__name__)
+
+    constant_waveforms = {pin: (lambda t, pin=pin: 100 * (pin + 1))
+                          for pin in leg.FLUID_SENSOR_PINS}
+    firmware = simulator.NanpyFirmware(constant_waveforms)
+    test_leg = leg.Leg(simulator.EmulatedSerialManager(firmware))
+    bulk_readings = test_leg.get_fluid_pressure_sensors()
+    separate_readings = (test_leg.get_top_low_fluid_pressure_sensor(),
+                         test_leg.get_top_high_fluid_pressure_sensor(),
+                         test_leg.get_bottom_fluid_pressure_sensor())
+    assert bulk_readings == separate_readings, (bulk_readings, separate_readings)
+    logger.info("Bulk and separate reads both gave %s", bulk_readings)
+
+    stock_firmware = simulator.NanpyFirmware(constant_waveforms, analog_array=False)
+    stock_leg = leg.Leg(simulator.EmulatedSerialManager(stock_firmware))
+    fallback_readings = stock_leg.get_fluid_pressure_sensors()
+    assert fallback_readings == separate_readings, (fallback_readings, separate_readings)
+    logger.info("Reads without the AnalogArray class fell back to separate reads, giving %s",
+                fallback_readings)
+
+    start_time = time.perf_counter()
+    for _ in range(NUM_READS):
+        test_leg.get_fluid_pressure_sensors()
+    bulk_rate = NUM_READS / (time.perf_counter() - start_time)
+    start_time = time.perf_counter()
+    for _ in range(NUM_READS):
+        stock_leg.get_fluid_pressure_sensors()
+    separate_rate = NUM_READS / (time.perf_counter() - start_time)
+    logger.info("Bulk reads: %.0f samples/s; separate reads: %.0f samples/s",
+                bulk_rate, separate_rate)
+
+if __name__ == "__main__":
+    compare_reads()
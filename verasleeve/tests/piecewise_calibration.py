@@ -0,0 +1,48 @@
+#!/usr/bin/env python3
+"""Tests that piecewise calibrations and interpolators convert readings like np.interp, including
+for tables with a single point, repeated raw readings, or points out of order.
+"""
+# Python imports
+import random
+
+# Dependency imports
+import numpy as np
+
+# Package imports
+from .. import signal
+
+NUM_TABLES = 100
+MAX_TABLE_SIZE = 8
+NUM_READINGS = 200
+(LEFT_LIMIT, RIGHT_LIMIT) = (-100.0, 100.0)
+
+def random_table(num_points):
+    """Returns a list of random calibration points, in random order and with repeated raw
+    readings.
+    """
+    raws = [float(random.randrange(10)) for _ in range(num_points)]
+    return [(raw, random.gauss(0, 10)) for raw in raws]
+
+def reference_interp(readings, table, left_limit, right_limit):
+    """Returns the result of np.interp over the calibration table sorted by raw reading."""
+    (raws, values) = zip(*sorted(table, key=lambda point: point[0]))
+    return np.interp(readings, raws, values, left_limit, right_limit)
+
+def check_interpolators():
+    """Checks interpolators on single readings and arrays of readings, with and without limits."""
+    for _ in range(NUM_TABLES):
+        table = random_table(random.randint(1, MAX_TABLE_SIZE))
+        readings = np.concatenate([np.random.uniform(-2, 12, NUM_READINGS),
+                                   [raw for (raw, _) in table]])
+        for (left_limit, right_limit) in ((LEFT_LIMIT, RIGHT_LIMIT), (None, None)):
+            interpolator = signal.get_interpolator(table, left_limit, right_limit)
+            expected = reference_interp(readings, table, left_limit, right_limit)
+            assert np.allclose(interpolator(readings), expected), table
+            assert all(np.isclose(interpolator(reading), expected_value)
+                       for (reading, expected_value) in zip(readings, expected)), table
+
+if __name__ == "__main__":
+    random.seed(0)
+    np.random.seed(0)
+    check_interpolators()
+    print("All piecewise calibration checks passed.")
@@ -0,0 +1,77 @@
+#!/usr/bin/env python3
+"""Tests the leg monitor and sleeve controller on emulated Arduinos running the nanpy firmware on
+pseudo-terminals, with fluid pressures which respond to the contractions of the sleeve.
+"""
+# Python imports
+import logging
+import time
+
+# Dependency imports
+import numpy as np
+import nanpy
+import pykka
+
+# Package imports
+from .. import leg, simulator, sleeve
+
+logging.basicConfig(level=logging.INFO)
+
+LATENCY = 0.002
+LEG_INTERVAL = 0.01
+SLEEVE_INTERVAL = 0.05
+DURATION = 10
+
+class PressureRecorder(pykka.ThreadingActor):
+    """Records the fluid pressures it receives."""
+    def __init__(self):
+        super().__init__()
+        self.pressures = []
+
+    def on_receive(self, message):
+        self.pressures.append(message['data'])
+
+    def get_pressures(self):
+        return np.array(self.pressures)
+
+def run_fixture():
+    """Drives the sleeve while monitoring the leg, and reports the sample rate and the range of
+    the fluid pressures.
+    """
+    logger = logging.getLogger(__name__)
+
+    pressure_model = simulator.LegPressureModel()
+    leg_board = simulator.NanpyDevice(simulator.NanpyFirmware(pressure_model=pressure_model),
+                                      LATENCY).start()
+    sleeve_board = simulator.NanpyDevice(simulator.NanpyFirmware(pressure_model=pressure_model),
+                                         LATENCY).start()
+    logger.info("Emulating the leg on %s and the sleeve on %s",
+                leg_board.device, sleeve_board.device)
+    try:
+        leg_monitor = leg.LegMonitor.start(
+            leg.Leg(nanpy.SerialManager(device=leg_board.device)))
+        sleeve_controller = sleeve.AdditiveSleeveController.start(
+            sleeve.SleeveServos(nanpy.SerialManager(device=sleeve_board.device)))
+    except RuntimeError:
+        pykka.ActorRegistry.stop_all() # stop actors in LIFO order
+        raise
+    unit_converter = leg.LegUnitConverter.start()
+    recorder = PressureRecorder.start()
+    leg_monitor.proxy().register(unit_converter, 'fluid pressure')
+    unit_converter.proxy().register(recorder, 'fluid pressure')
+
+    logger.info("Running for %s seconds...", DURATION)
+    leg_monitor.tell({'command': 'start producing', 'interval': LEG_INTERVAL})
+    sleeve_controller.tell({'command': 'start producing', 'interval': SLEEVE_INTERVAL})
+    time.sleep(DURATION)
+    leg_monitor.ask({'command': 'stop producing'})
+    sleeve_controller.ask({'command': 'stop producing'})
+    logger.info("Leg monitor timing: %s", leg_monitor.proxy().get_timing_statistics().get())
+    pressures = recorder.proxy().get_pressures().get()
+    logger.info("Recorded %s samples; top pressure ranged from %.1f to %.1f mmHg",
+                len(pressures), pressures[:, 0].min(), pressures[:, 0].max())
+    pykka.ActorRegistry.stop_all()
+    leg_board.stop()
+    sleeve_board.stop()
+
+if __name__ == "__main__":
+    run_fixture()
@@ -0,0 +1,170 @@
+#!/usr/bin/env python3
+"""Tests that streaming and block filtering give the same results as re-evaluating reference
+filters over each window, and that the sample buffers hold the same samples as a deque.
+"""
+# Python imports
+import random
+from collections import deque
+
+# Dependency imports
+import numpy as np
+
+# Package imports
+from .. import buffers, signal
+
+MAX_WINDOW_SIZE = 10
+SIGNAL_LENGTH = 200
+BLOCK_SIZES = (1, 2, 3, 7, 16)
+# Running statistics accumulate rounding errors, which the square root of StdFilter magnifies
+TOLERANCE = 1e-6
+
+def noisy_signal(length, num_levels=None):
+    """Returns a list of random samples. If num_levels is not None, the samples are integers
+    between 0 and num_levels - 1, so that the signal has many ties.
+    """
+    if num_levels is not None:
+        return [float(random.randrange(num_levels)) for _ in range(length)]
+    return [random.gauss(0, 10) for _ in range(length)]
+
+def reference_filter(values, max_samples, filterer):
+    """Returns the results of filterer over a deque of the max_samples most recent samples, after
+    each sample is added.
+    """
+    window = deque(maxlen=max_samples)
+    results = []
+    for value in values:
+        window.append(value)
+        results.append(filterer(np.array(window)))
+    return np.array(results)
+
+def split_blocks(values, block_size):
+    """Splits a list of values into NumPy arrays of block_size consecutive values."""
+    return [np.array(values[start:start + block_size])
+            for start in range(0, len(values), block_size)]
+
+def check_window_filters():
+    """Checks the streaming filters one sample at a time and in blocks."""
+    filters = {
+        signal.MedianFilter: np.median,
+        signal.MaxFilter: np.max,
+        signal.MinFilter: np.min,
+        signal.ExtremaFilter: lambda window: (np.min(window), np.max(window)),
+        signal.MeanFilter: np.mean,
+        signal.VarianceFilter: np.var,
+        signal.StdFilter: np.std
+    }
+    for (filter_class, filterer) in filters.items():
+        for max_samples in range(1, MAX_WINDOW_SIZE + 1):
+            for num_levels in (None, 3):
+                values = noisy_signal(SIGNAL_LENGTH, num_levels)
+                expected = reference_filter(values, max_samples, filterer)
+                window_filter = filter_class(max_samples)
+                results = []
+                for value in values:
+                    window_filter.append(value)
+                    results.append(window_filter.result())
+                assert np.allclose(results, expected, atol=TOLERANCE), (filter_class, max_samples)
+                for block_size in BLOCK_SIZES:
+                    window_filter.clear()
+                    results = np.concatenate([window_filter.extend(block)
+                                              for block in split_blocks(values, block_size)])
+                    assert np.allclose(results, expected, atol=TOLERANCE), \
+                        (filter_class, max_samples, block_size)
+
+def check_channel_filters():
+    """Checks that multi-channel filters give the results of filtering each channel
+    separately, one sample at a time and in blocks.
+    """
+    num_channels = 3
+    for filterer in (np.median, signal.extrema, np.mean):
+        for max_samples in range(1, MAX_WINDOW_SIZE + 1):
+            channels = [noisy_signal(SIGNAL_LENGTH, 4) for _ in range(num_channels)]
+            values = np.array(channels).T
+            expected = np.stack([reference_filter(channel, max_samples, filterer)
+                                 for channel in channels], axis=1)
+            window_filter = signal.get_window_filter(filterer, max_samples, num_channels)
+            assert isinstance(window_filter, signal.ChannelFilter), filterer
+            results = []
+            for value in values:
+                window_filter.append(value)
+                results.append(window_filter.result())
+            assert np.allclose(results, expected), (filterer, max_samples)
+            for block_size in BLOCK_SIZES:
+                window_filter.clear()
+                results = np.concatenate([window_filter.extend(values[start:start + block_size])
+                                          for start in range(0, SIGNAL_LENGTH, block_size)])
+                assert np.allclose(results, expected), (filterer, max_samples, block_size)
+
+def check_moving_filter():
+    """Checks that the sample numbers and results of the moving filter are the same for single
+    samples and for blocks, in both modes.
+    """
+    for mode in ("centered", "right"):
+        for max_samples in range(1, MAX_WINDOW_SIZE + 1):
+            values = noisy_signal(SIGNAL_LENGTH, 5)
+            sample_numbers = list(range(SIGNAL_LENGTH))
+            single_filter = signal.moving_filter(max_samples, np.median, mode)
+            expected = [single_filter.send(sample) for sample in zip(sample_numbers, values)]
+            expected = [filtered for filtered in expected if filtered is not None]
+            assert all(type(filtered[0]) is int for filtered in expected), (max_samples, mode)
+            if mode == "centered":
+                assert expected[0][0] == (max_samples - 1) - max_samples // 2, (max_samples, mode)
+            for block_size in BLOCK_SIZES:
+                block_filter = signal.moving_filter(max_samples, np.median, mode)
+                filtered = [block_filter.send(block) for block
+                            in zip(split_blocks(sample_numbers, block_size),
+                                   split_blocks(values, block_size))]
+                filtered_numbers = np.concatenate([block[0] for block in filtered])
+                filtered_values = np.concatenate([block[1] for block in filtered])
+                assert np.array_equal(filtered_numbers, [sample[0] for sample in expected]), \
+                    (max_samples, mode, block_size)
+                assert np.allclose(filtered_values, [sample[1] for sample in expected]), \
+                    (max_samples, mode, block_size)
+
+def check_ring_buffer():
+    """Checks that ring buffers hold the same samples as a deque, across wraparounds."""
+    for capacity in (None, 1, 2, 5, 16):
+        ring_buffer = buffers.RingBuffer(capacity, dtype=int)
+        reference = deque(maxlen=capacity)
+        for _ in range(SIGNAL_LENGTH):
+            num_values = random.choice((0, 1, 1, 1, 3, 20))
+            values = [random.randrange(1000) for _ in range(num_values)]
+            if num_values == 1:
+                ring_buffer.append(values[0])
+            else:
+                ring_buffer.extend(values)
+            reference.extend(values)
+            assert len(ring_buffer) == len(reference), capacity
+            assert list(ring_buffer.view()) == list(reference), capacity
+            if reference:
+                assert ring_buffer[0] == reference[0] and ring_buffer[-1] == reference[-1]
+
+def check_summary_pyramid():
+    """Checks that the buckets of each level of a summary pyramid summarize the samples they
+    span.
+    """
+    values = noisy_signal(SIGNAL_LENGTH)
+    times = np.arange(SIGNAL_LENGTH) * 0.1
+    pyramid = buffers.SummaryPyramid()
+    pyramid.append(times[0], values[0])
+    pyramid.extend(times[1:50], values[1:50])
+    for (time, value) in zip(times[50:], values[50:]):
+        pyramid.append(time, value)
+    assert len(pyramid) == SIGNAL_LENGTH
+    for max_buckets in (SIGNAL_LENGTH, 50, 10, 3):
+        (starts, mins, maxes, means, level) = pyramid.summarize(max_buckets=max_buckets)
+        bucket_size = 2 ** level
+        for (bucket, start) in enumerate(range(0, SIGNAL_LENGTH, bucket_size)):
+            span = values[start:start + bucket_size]
+            assert starts[bucket] == times[start], (max_buckets, bucket)
+            assert mins[bucket] == min(span) and maxes[bucket] == max(span), (max_buckets, bucket)
+            assert np.isclose(means[bucket], np.mean(span)), (max_buckets, bucket)
+
+if __name__ == "__main__":
+    random.seed(0)
+    check_window_filters()
+    check_channel_filters()
+    check_moving_filter()
+    check_ring_buffer()
+    check_summary_pyramid()
+    print("All streaming filter and buffer checks passed.")
@@ -0,0 +1,62 @@
+#!/usr/bin/env python3
+"""Tests streaming acquisition from the leg, on an emulated Arduino running the LegStreaming
+sketch on a pseudo-terminal.
+"""
+# Python imports
+import logging
+import time
+
+# Dependency imports
+import numpy as np
+import pykka
+
+# Package imports
+from .. import actors, leg, simulator
+
+logging.basicConfig(level=logging.INFO)
+
+STREAM_INTERVAL = 0.001
+STREAM_DURATION = 2
+
+class SampleCounter(pykka.ThreadingActor):
+    """Counts the samples it receives, and checks that their times increase."""
+    def __init__(self):
+        super().__init__()
+        self.num_batches = 0
+        self.num_samples = 0
+        self.last_time = -np.inf
+        self.times_increase = True
+
+    def on_receive(self, message):
+        self.num_batches += 1
+        self.num_samples += len(message['time'])
+        self.times_increase &= bool(np.all(np.diff(message['time'], prepend=self.last_time) > 0))
+        self.last_time = message['time'][-1]
+
+    def get_counts(self):
+        return (self.num_batches, self.num_samples, self.times_increase)
+
+def stream():
+    """Streams samples from the emulated board, and reports how many were received."""
+    logger = logging.getLogger(__name__)
+
+    # Start the board's clock just before micros() wraps around
+    device = simulator.StreamingLegDevice(boot_micros=2 ** 32 - 500000).start()
+    counter = SampleCounter.start()
+    monitor = actors.start(leg.LegStreamMonitor, leg.StreamingLeg(device.device))
+    monitor.proxy().register(counter, 'fluid pressure')
+    logger.info("Streaming for %s seconds at an interval of %s seconds...",
+                STREAM_DURATION, STREAM_INTERVAL)
+    monitor.tell({'command': 'start producing', 'interval': STREAM_INTERVAL})
+    time.sleep(STREAM_DURATION)
+    monitor.tell({'command': 'stop producing'})
+    statistics = monitor.proxy().get_stream_statistics().get()
+    (num_batches, num_samples, times_increase) = counter.proxy().get_counts().get()
+    logger.info("Received %s samples in %s batches (expected about %s); stream statistics: %s",
+                num_samples, num_batches, int(STREAM_DURATION / STREAM_INTERVAL), statistics)
+    assert times_increase, "Sample times did not always increase"
+    pykka.ActorRegistry.stop_all()
+    device.stop()
+
+if __name__ == "__main__":
+    stream()
@@ -0,0 +1,77 @@
+#!/usr/bin/env python3
+"""Tests simulating a session of driving the sleeve while monitoring the leg faster than real
+time, on a virtual clock with emulated Arduinos.
+"""
+# Python imports
+import logging
+import time
+
+# Dependency imports
+import numpy as np
+import pykka
+
+# Package imports
+from .. import clocks, leg, simulator, sleeve
+
+logging.basicConfig(level=logging.INFO)
+
+LEG_INTERVAL = 0.01
+SLEEVE_INTERVAL = 0.05
+DURATION = 600
+SEED = 0
+
+class SampleRecorder(pykka.ThreadingActor):
+    """Records the data samples it receives."""
+    def __init__(self):
+        super().__init__()
+        self.times = []
+        self.data = []
+
+    def on_receive(self, message):
+        self.times.append(message['time'])
+        self.data.append(message['data'])
+
+    def get_samples(self):
+        return (np.array(self.times), np.array(self.data))
+
+def simulate_session():
+    """Simulates a session on a new virtual clock, and returns the recorded samples."""
+    clock = clocks.VirtualClock()
+    pressure_model = simulator.LegPressureModel(clock=clock, seed=SEED)
+    leg_connection = simulator.EmulatedSerialManager(
+        simulator.NanpyFirmware(pressure_model=pressure_model), round_trip_time=0)
+    sleeve_connection = simulator.EmulatedSerialManager(
+        simulator.NanpyFirmware(pressure_model=pressure_model), round_trip_time=0)
+    leg_monitor = leg.LegMonitor.start(leg.Leg(leg_connection), clock)
+    sleeve_controller = sleeve.AdditiveSleeveController.start(
+        sleeve.SleeveServos(sleeve_connection, clock), clock=clock)
+    recorder = SampleRecorder.start()
+    leg_monitor.proxy().register(recorder, 'fluid pressure')
+
+    leg_monitor.ask({'command': 'start producing', 'interval': LEG_INTERVAL})
+    sleeve_controller.ask({'command': 'start producing', 'interval': SLEEVE_INTERVAL})
+    clock.run_for(DURATION)
+    leg_monitor.ask({'command': 'stop producing'})
+    sleeve_controller.ask({'command': 'stop producing'})
+    samples = recorder.proxy().get_samples().get()
+    pykka.ActorRegistry.stop_all()
+    return samples
+
+def compare_sessions():
+    """Simulates the same session twice, and checks that both gave the same samples."""
+    logger = logging.getLogger(__name__)
+
+    logger.info("Simulating %s seconds twice...", DURATION)
+    start_time = time.perf_counter()
+    (times, data) = simulate_session()
+    logger.info("Simulated %s samples in %.1f seconds", len(times),
+                time.perf_counter() - start_time)
+    logger.info("Raw top low-range readings ranged from %s to %s",
+                data[:, 0].min(), data[:, 0].max())
+    (repeated_times, repeated_data) = simulate_session()
+    assert np.array_equal(times, repeated_times) and np.array_equal(data, repeated_data), \
+        "The simulated sessions differed"
+    logger.info("Both simulations gave the same samples")
+
+if __name__ == "__main__":
+    compare_sessions()
@@ -0,0 +1,92 @@
+"""Support for tracing the messages passing through actors without slowing them down.
+Hot paths check a Tracer's enabled attribute, which is a cached copy of whether its logger logs
+at the DEBUG level, before doing any other work for tracing:
+
+    if _tracer.enabled:
+        _tracer.trace(self, 'broadcast', message, broadcast_class)
+
+so tracing costs a single attribute lookup per message while it is disabled. The tracers of
+the actors module are refreshed whenever a Broadcaster or Producer is created and whenever a
+Producer starts producing, so that logging can be configured after importing verasleeve as
+usual. Otherwise, the cached level checks do not notice changes to the logging configuration,
+so call refresh after changing it while actors are running.
+"""
+# Python imports
+import logging
+import threading
+
+_tracers = {}
+_tracers_lock = threading.Lock()
+
+class Tracer(object):
+    """Logs structured trace records of messages at the DEBUG level of a logger.
+    When enabled, a tracer can be set to only log every Nth message it is given, so that tracing
+    does not distort the timing of the actors being traced. Each record is logged with a trace
+    attribute holding a dict with the actor, event, channel, and the type, time, and command
+    entries of the message, for handlers or filters which process the records.
+
+    Arguments:
+        name: the name of the logger.
+        every: only every Nth traced message is logged.
+    """
+    def __init__(self, name, every=1):
+        super().__init__()
+        self.logger = logging.getLogger(name)
+        self.every = every
+        self.enabled = False
+        self.__count = 0
+        self.refresh()
+
+    def refresh(self):
+        """Updates the cached check of whether the tracer's logger logs at the DEBUG level."""
+        self.enabled = self.logger.isEnabledFor(logging.DEBUG)
+
+    def trace(self, actor, event, message, channel=None):
+        """Logs a trace record of a message handled by an actor, if it is one of the sampled
+        messages.
+
+        Arguments:
+            event: a short description of what the actor did with the message, e.g. 'received'.
+            channel: the broadcast class of the message, if any.
+        """
+        self.__count += 1
+        if self.__count < self.every:
+            return
+        self.__count = 0
+        record = {
+            'actor': str(actor),
+            'event': event,
+            'channel': channel,
+            'type': message.get('type'),
+            'time': message.get('time'),
+            'command': message.get('command')
+        }
+        self.logger.debug("%s: %s on %s: %s", actor, event, channel, message,
+                          extra={'trace': record})
+
+def get_tracer(name):
+    """Returns the tracer for the specified logger name, creating it if needed."""
+    with _tracers_lock:
+        if name not in _tracers:
+            _tracers[name] = Tracer(name)
+        return _tracers[name]
+
+def refresh():
+    """Updates the cached level checks of all tracers."""
+    with _tracers_lock:
+        for tracer in _tracers.values():
+            tracer.refresh()
+
+def configure(every=1, level=logging.DEBUG, name='verasleeve'):
+    """Enables or disables tracing, and sets how often messages are sampled.
+
+    Arguments:
+        every: all tracers log only every Nth traced message.
+        level: the logging level to set on the logger with the specified name. DEBUG enables
+        the tracers under that logger, and any higher level disables them.
+    """
+    logging.getLogger(name).setLevel(level)
+    with _tracers_lock:
+        for tracer in _tracers.values():
+            tracer.every = every
+            tracer.refresh()